@@ -0,0 +1,187 @@
+"""Асинхронные варианты эндпоинтов чтения для запуска через ASGI.
+
+Отвечают на GET запросы за JSON асинхронным ORM и теми же
+сериализаторами, что и viewsets. Остальные методы, браузерный API,
+ошибки и пагинация курсором передаются синхронным viewsets.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.paginator import InvalidPage
+from django.http import HttpResponse
+from recipes import membership
+from rest_framework.authentication import get_authorization_header
+from rest_framework.authtoken.models import Token
+from rest_framework.settings import api_settings
+
+from . import reference, response_cache
+from .authentication import token_cache
+from .autocomplete import aautocomplete_ingredients, get_limit
+from .filters import RecipeFilter
+from .mixins import conditional_response
+from .pagination import CachedCountPageNumberPagination
+from .profiling import serializer_data
+from .renderers import FastJSONRenderer
+from .values_serializers import RecipeValuesSerializer
+from .views import RecipeViewSet
+
+
+def json_response(data):
+    return HttpResponse(FastJSONRenderer().render(data),
+                        content_type='application/json')
+
+
+def accepts_json(request):
+    return ('format' not in request.GET
+            and 'text/html' not in request.headers.get('Accept', ''))
+
+
+async def get_user(request):
+    """Пользователь по токену, None - если проверку нужно отдать DRF"""
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != b'token':
+        return AnonymousUser()
+    if len(auth) != 2:
+        return None
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        return None
+    user = await token_cache.aget(key)
+    if user is not None:
+        return user
+    token = await (Token.objects.select_related('user').
+                   filter(key=key).afirst())
+    if token is None or not token.user.is_active:
+        return None
+    await token_cache.aset(key, token.user)
+    return token.user
+
+
+async def load_memberships(request):
+    for target in (membership.following, membership.favorites,
+                   membership.shopping_cart):
+        await target.aload(request)
+
+
+def as_view(view, fallback):
+    """Асинхронный view, который передает fallback то, что не обработал.
+
+    view возвращает None, если ответ должен сформировать viewset.
+    """
+    methods = set(fallback.actions) | {'head', 'options'}
+    allow = ', '.join(method.upper()
+                      for method in fallback.cls.http_method_names
+                      if method in methods)
+    sync_fallback = sync_to_async(fallback)
+
+    @wraps(view)
+    async def wrapped(request, **kwargs):
+        if request.method == 'GET' and accepts_json(request):
+            user = await get_user(request)
+            if user is not None:
+                request.user = user
+                response = await view(request, **kwargs)
+                if response is not None:
+                    response['Allow'] = allow
+                    response['Vary'] = 'Accept'
+                    return response
+        return await sync_fallback(request, **kwargs)
+
+    wrapped.csrf_exempt = True
+    return wrapped
+
+
+async def recipe_list(request):
+    if request.GET.get('pagination') == 'cursor':
+        return None
+    anonymous = not request.user.is_authenticated
+    if anonymous:
+        key, data = await response_cache.aget_cached_list(request)
+        if data is not None:
+            return json_response(data)
+    if 'tags' in request.GET:
+        await reference.tags.aload()
+    filterset = RecipeFilter(request.GET, request=request,
+                             queryset=RecipeViewSet.queryset.all())
+    if not filterset.is_valid():
+        return None
+    pagination = CachedCountPageNumberPagination()
+    pagination.request = request
+    paginator = pagination.django_paginator_class(
+        RecipeValuesSerializer.get_queryset(filterset.qs),
+        pagination.page_size)
+    await paginator.acount()
+    try:
+        page = paginator.page(
+            request.GET.get(pagination.page_query_param, 1))
+    except InvalidPage:
+        return None
+    page.object_list = [recipe async for recipe in page.object_list]
+    await load_memberships(request)
+    serializer = RecipeValuesSerializer(
+        page.object_list, many=True,
+        context={'request': request, 'image_rendition': 'medium'})
+    await serializer.aprepare()
+    pagination.page = page
+    data = pagination.get_paginated_response(
+        serializer_data(serializer)).data
+    if anonymous:
+        await response_cache.aset_cached_list(key, data)
+    return json_response(data)
+
+
+async def recipe_detail(request, pk):
+    anonymous = not request.user.is_authenticated
+    if anonymous:
+        data = await response_cache.aget_cached_detail(request, pk)
+        if data is not None:
+            return json_response(data)
+    recipe = await RecipeValuesSerializer.get_queryset(
+        RecipeViewSet.queryset.filter(pk=pk)).afirst()
+    if recipe is None:
+        return None
+    await load_memberships(request)
+    serializer = RecipeValuesSerializer(recipe, context={'request': request})
+    await serializer.aprepare()
+    data = serializer_data(serializer)
+    if anonymous:
+        await response_cache.aset_cached_detail(
+            request, pk, recipe['author_id'], data)
+    return json_response(data)
+
+
+async def tag_list(request):
+    await reference.tags.aload()
+    return conditional_response(request, reference.tags.version,
+                                lambda: json_response(reference.tags.data))
+
+
+async def tag_detail(request, pk):
+    await reference.tags.aload()
+    data = reference.tags.get_data(pk)
+    if data is None:
+        return None
+    return conditional_response(request, reference.tags.version,
+                                lambda: json_response(data))
+
+
+async def ingredient_list(request):
+    await reference.ingredients.aload()
+    query = request.GET.get(api_settings.SEARCH_PARAM)
+    if query:
+        data = await aautocomplete_ingredients(query, get_limit(request.GET))
+    else:
+        data = reference.ingredients.data
+    return conditional_response(request, reference.ingredients.version,
+                                lambda: json_response(data))
+
+
+async def ingredient_detail(request, pk):
+    await reference.ingredients.aload()
+    data = reference.ingredients.get_data(pk)
+    if data is None:
+        return None
+    return conditional_response(request, reference.ingredients.version,
+                                lambda: json_response(data))
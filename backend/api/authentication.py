@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from recipes.metrics import CACHE_REQUESTS, cache_lookup
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+# Хеш пароля в кеш не попадает, при обращении он загружается из базы
+USER_FIELDS = tuple(field.attname for field in User._meta.concrete_fields
+                    if field.attname != 'password')
+USER_PK_INDEX = USER_FIELDS.index(User._meta.pk.attname)
+
+
+class TokenCache:
+    """Пользователи по ключу токена в кеше процесса и общем кеше.
+
+    Хранятся значения полей пользователя без пароля, каждый запрос
+    получает из них свой объект. Записи процесса живут
+    TOKEN_CACHE_LOCAL_TIMEOUT секунд и вытесняются по LRU. Общий кеш
+    используется, только если он общий для всех процессов
+    (CACHE_SHARED), его записи удаляются сигналами при выходе, смене
+    пароля, деактивации и других изменениях пользователя.
+    """
+
+    def __init__(self):
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_key(token_key):
+        return f'auth:token:{sha256(token_key.encode()).hexdigest()}'
+
+    @staticmethod
+    def get_user_key(user_id):
+        return f'auth:user:{user_id}'
+
+    @staticmethod
+    def pack(user):
+        return tuple(getattr(user, name) for name in USER_FIELDS)
+
+    @staticmethod
+    def unpack(values):
+        """Пользователь с отложенным полем password"""
+        return User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, values)
+
+    def get_local(self, key):
+        with self.lock:
+            entry = self.local.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self.local.move_to_end(key)
+                    CACHE_REQUESTS.labels('auth_token', 'hit').inc()
+                    return entry[2]
+                del self.local[key]
+        return None
+
+    def get(self, token_key):
+        key = self.get_key(token_key)
+        values = self.get_local(key)
+        if values is None:
+            if settings.CACHE_SHARED:
+                values = cache.get(key)
+            values = cache_lookup('auth_token', values)
+            if values is None:
+                return None
+            self.set_local(key, values)
+        return self.unpack(values)
+
+    async def aget(self, token_key):
+        """get для асинхронных views"""
+        key = self.get_key(token_key)
+        values = self.get_local(key)
+        if values is None:
+            if settings.CACHE_SHARED:
+                values = await cache.aget(key)
+            values = cache_lookup('auth_token', values)
+            if values is None:
+                return None
+            self.set_local(key, values)
+        return self.unpack(values)
+
+    def get_shared_entries(self, key, values):
+        return {key: values, self.get_user_key(values[USER_PK_INDEX]): key}
+
+    def set(self, token_key, user):
+        key = self.get_key(token_key)
+        values = self.pack(user)
+        if settings.CACHE_SHARED:
+            cache.set_many(self.get_shared_entries(key, values),
+                           settings.TOKEN_CACHE_TIMEOUT)
+        self.set_local(key, values)
+
+    async def aset(self, token_key, user):
+        """set для асинхронных views"""
+        key = self.get_key(token_key)
+        values = self.pack(user)
+        if settings.CACHE_SHARED:
+            await cache.aset_many(self.get_shared_entries(key, values),
+                                  settings.TOKEN_CACHE_TIMEOUT)
+        self.set_local(key, values)
+
+    def set_local(self, key, values):
+        with self.lock:
+            self.local[key] = (
+                time.monotonic() + settings.TOKEN_CACHE_LOCAL_TIMEOUT,
+                values[USER_PK_INDEX], values)
+            self.local.move_to_end(key)
+            while len(self.local) > settings.TOKEN_CACHE_MAX_SIZE:
+                self.local.popitem(last=False)
+
+    def invalidate(self, user_id):
+        keys = []
+        with self.lock:
+            for local_key, (_, entry_user_id, _) in list(self.local.items()):
+                if entry_user_id == user_id:
+                    del self.local[local_key]
+                    keys.append(local_key)
+        if not settings.CACHE_SHARED:
+            return
+        user_key = self.get_user_key(user_id)
+        key = cache.get(user_key)
+        if key is not None:
+            keys.append(key)
+        cache.delete_many([user_key, *keys])
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе для закешированных токенов"""
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user)
+            return user, token
+        return user, Token(key=key, user=user)
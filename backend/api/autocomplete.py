@@ -0,0 +1,110 @@
+from bisect import bisect_left
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+from recipes.metrics import cache_lookup
+from recipes.models import Ingredient
+
+from .reference import ingredients
+
+
+class IngredientIndex:
+    """Ингредиенты, отсортированные по названию в нижнем регистре.
+
+    Префиксные совпадения находятся бинарным поиском, совпадения
+    внутри названия - проходом по списку.
+    """
+
+    def __init__(self, ingredients):
+        self.items = sorted(
+            ((ingredient['name'].lower(), ingredient)
+             for ingredient in ingredients),
+            key=lambda item: item[0])
+        self.keys = [key for key, _ in self.items]
+
+    def search(self, query, limit):
+        result = []
+        position = bisect_left(self.keys, query)
+        while (len(result) < limit and position < len(self.keys)
+               and self.keys[position].startswith(query)):
+            result.append(self.items[position][1])
+            position += 1
+        for key, ingredient in self.items:
+            if len(result) >= limit:
+                break
+            if query in key and not key.startswith(query):
+                result.append(ingredient)
+        return result
+
+
+_index = {'version': None, 'index': None}
+
+
+def get_ingredient_index():
+    """Индекс в памяти процесса, перестраивается при смене версии"""
+    version = ingredients.version
+    if _index['version'] != version:
+        _index['index'] = IngredientIndex(ingredients.data)
+        _index['version'] = version
+    return _index['index']
+
+
+def search_queryset(query, limit):
+    """Поиск по индексам pg_trgm и text_pattern_ops в PostgreSQL"""
+    return (Ingredient.objects.
+            filter(name__icontains=query).
+            annotate(rank=Case(When(name__istartswith=query, then=Value(0)),
+                               default=Value(1), output_field=IntegerField())).
+            order_by('rank', 'name').
+            values(*ingredients.fields)[:limit])
+
+
+def get_limit(params):
+    """Параметр limit в пределах настроек автодополнения"""
+    try:
+        limit = int(params.get(
+            'limit', settings.INGREDIENTS_AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        limit = settings.INGREDIENTS_AUTOCOMPLETE_LIMIT
+    return min(max(limit, 1), settings.INGREDIENTS_AUTOCOMPLETE_MAX_LIMIT)
+
+
+def normalize_query(query):
+    return ' '.join(query.lower().split())
+
+
+def get_cache_key(query, limit):
+    digest = md5(query.encode()).hexdigest()
+    return f'ingredients:autocomplete:{ingredients.version}:{limit}:{digest}'
+
+
+def autocomplete_ingredients(query, limit):
+    """Ингредиенты, начинающиеся с query, затем содержащие query"""
+    query = normalize_query(query)
+    key = get_cache_key(query, limit)
+    result = cache_lookup('ingredients_autocomplete', cache.get(key))
+    if result is None:
+        if connection.vendor == 'postgresql':
+            result = list(search_queryset(query, limit))
+        else:
+            result = get_ingredient_index().search(query, limit)
+        cache.set(key, result, settings.INGREDIENTS_AUTOCOMPLETE_CACHE_TIMEOUT)
+    return result
+
+
+async def aautocomplete_ingredients(query, limit):
+    """То же для асинхронных views, справочник должен быть загружен"""
+    query = normalize_query(query)
+    key = get_cache_key(query, limit)
+    result = cache_lookup('ingredients_autocomplete', await cache.aget(key))
+    if result is None:
+        if connection.vendor == 'postgresql':
+            result = [row async for row in search_queryset(query, limit)]
+        else:
+            result = get_ingredient_index().search(query, limit)
+        await cache.aset(key, result,
+                         settings.INGREDIENTS_AUTOCOMPLETE_CACHE_TIMEOUT)
+    return result
@@ -0,0 +1,99 @@
+"""Сжатие ответов по заголовку Accept-Encoding.
+
+Brotli используется, если установлен пакет brotli и клиент его
+принимает, иначе gzip. Сжимаются JSON и текстовые ответы от
+COMPRESSION_MIN_SIZE байт, потоковые выгрузки отдаются как есть.
+"""
+import asyncio
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+
+def compress_brotli(content):
+    return brotli.compress(content,
+                           quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+
+def compress_gzip(content):
+    return gzip.compress(content, settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+CODERS = {'gzip': compress_gzip}
+if brotli is not None:
+    CODERS = {'br': compress_brotli, **CODERS}
+
+
+def get_accepted_encodings(header):
+    """Кодировки из Accept-Encoding, кроме отключенных через q=0"""
+    encodings = set()
+    for item in header.split(','):
+        name, *params = item.split(';')
+        quality = 1
+        for param in params:
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if quality > 0:
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+def get_encoding(header):
+    encodings = get_accepted_encodings(header)
+    for encoding in CODERS:
+        if encoding in encodings or '*' in encodings:
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    @staticmethod
+    def compress(request, response):
+        if (response.streaming or response.has_header('Content-Encoding')
+                or len(response.content) < settings.COMPRESSION_MIN_SIZE
+                or not response.get('Content-Type', '').startswith(
+                    COMPRESSIBLE_TYPES)):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = get_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+        content = CODERS[encoding](response.content)
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        # Сжатый ответ не совпадает побайтно, ETag становится слабым
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = f'W/{etag}'
+        return response
@@ -0,0 +1,45 @@
+"""Статистика соединений с базой данных в текущем процессе.
+
+Показывает, насколько часто переиспользуются постоянные соединения:
+при CONN_MAX_AGE = 0 соединений открывается столько же, сколько
+обработано запросов.
+"""
+import threading
+import time
+
+from django.core.signals import request_finished
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_lock = threading.Lock()
+_stats = {'connections_opened': 0, 'requests': 0}
+_opened_at = threading.local()
+
+
+@receiver(connection_created, dispatch_uid='api_connection_created')
+def count_connection(sender, connection, **kwargs):
+    setattr(_opened_at, connection.alias, time.monotonic())
+    with _lock:
+        _stats['connections_opened'] += 1
+
+
+@receiver(request_finished, dispatch_uid='api_request_finished')
+def count_request(sender, **kwargs):
+    with _lock:
+        _stats['requests'] += 1
+
+
+def get_stats(alias='default'):
+    """Счетчики процесса и возраст соединения текущего потока"""
+    connection = connections[alias]
+    opened_at = getattr(_opened_at, alias, None)
+    with _lock:
+        stats = dict(_stats)
+    stats.update(
+        conn_max_age=connection.settings_dict['CONN_MAX_AGE'],
+        conn_health_checks=connection.settings_dict['CONN_HEALTH_CHECKS'],
+        connection_age=(
+            round(time.monotonic() - opened_at, 3)
+            if connection.connection is not None and opened_at else None))
+    return stats
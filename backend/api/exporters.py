@@ -0,0 +1,144 @@
+import csv
+import json
+import logging
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.negotiation import DefaultContentNegotiation
+
+CHUNK_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """Параметр format выбирает формат файла, а не рендерер ответа"""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderer = renderers[0]
+        return renderer, renderer.media_type
+
+
+class Echo:
+    """Буфер, который сразу отдает записанную строку"""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingCartWriter:
+    """Базовый класс формата выгрузки списка покупок.
+
+    write() получает итератор словарей с ключами ingredient__name,
+    ingredient__measurement_unit и total и отдает файл по частям.
+    """
+    format = None
+    content_type = None
+
+    def prepare(self):
+        """Проверяет до начала ответа, что файл можно собрать"""
+
+    def write(self, ingredients):
+        raise NotImplementedError
+
+
+class CSVWriter(ShoppingCartWriter):
+    format = 'csv'
+    content_type = 'text/csv'
+    fieldnames = ('Название', 'единица', 'количество')
+
+    def write(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.fieldnames)
+        for ingredient in ingredients:
+            yield writer.writerow((ingredient['ingredient__name'],
+                                   ingredient['ingredient__measurement_unit'],
+                                   ingredient['total']))
+
+
+class TXTWriter(ShoppingCartWriter):
+    format = 'txt'
+    content_type = 'text/plain; charset=utf-8'
+
+    def write(self, ingredients):
+        yield 'Список покупок\n\n'
+        for ingredient in ingredients:
+            yield (f'{ingredient["ingredient__name"]} '
+                   f'({ingredient["ingredient__measurement_unit"]}) — '
+                   f'{ingredient["total"]}\n')
+
+
+class JSONWriter(ShoppingCartWriter):
+    format = 'json'
+    content_type = 'application/json'
+
+    def write(self, ingredients):
+        separator = '['
+        for ingredient in ingredients:
+            yield separator + json.dumps({
+                'name': ingredient['ingredient__name'],
+                'measurement_unit': ingredient['ingredient__measurement_unit'],
+                'amount': ingredient['total']}, ensure_ascii=False)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
+
+
+class PDFWriter(ShoppingCartWriter):
+    """PDF собирается во временном файле и отдается частями"""
+    format = 'pdf'
+    content_type = 'application/pdf'
+    font_name = 'ShoppingCartFont'
+    font_size = 12
+    line_height = 18
+    margin = 50
+
+    def prepare(self):
+        """Регистрирует шрифт с кириллицей, без него текст не читается"""
+        if self.font_name in pdfmetrics.getRegisteredFontNames():
+            return
+        try:
+            pdfmetrics.registerFont(
+                TTFont(self.font_name, settings.SHOPPING_CART_PDF_FONT))
+        except (OSError, TTFError) as error:
+            message = (f'Не удалось загрузить шрифт SHOPPING_CART_PDF_FONT '
+                       f'{settings.SHOPPING_CART_PDF_FONT}: {error}')
+            logger.error(message)
+            raise ImproperlyConfigured(message) from error
+
+    def write(self, ingredients):
+        font = self.font_name
+        width, height = A4
+        with SpooledTemporaryFile(max_size=CHUNK_SIZE * 16) as file:
+            pdf = canvas.Canvas(file, pagesize=A4)
+            pdf.setFont(font, self.font_size)
+            y = height - self.margin
+            pdf.drawString(self.margin, y, 'Список покупок')
+            for ingredient in ingredients:
+                y -= self.line_height
+                if y < self.margin:
+                    pdf.showPage()
+                    pdf.setFont(font, self.font_size)
+                    y = height - self.margin
+                pdf.drawString(
+                    self.margin, y,
+                    f'{ingredient["ingredient__name"]} '
+                    f'({ingredient["ingredient__measurement_unit"]}) — '
+                    f'{ingredient["total"]}')
+            pdf.save()
+            file.seek(0)
+            while True:
+                chunk = file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+
+SHOPPING_CART_WRITERS = {
+    writer.format: writer
+    for writer in (CSVWriter, TXTWriter, JSONWriter, PDFWriter)
+}
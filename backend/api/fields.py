@@ -0,0 +1,162 @@
+import binascii
+import uuid
+from base64 import b64decode
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from drf_base64.fields import Base64ImageField
+from recipes.images import RENDITION_FIELDS
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+# Кратно 4, чтобы каждая часть декодировалась независимо
+BASE64_CHUNK_SIZE = 64 * 1024
+
+
+def get_objects_by_ids(reference_data, queryset, ids):
+    """Объекты в порядке ids: из справочника, остальные одним запросом.
+
+    Обо всех несуществующих id сообщает одной ошибкой.
+    """
+    objects = reference_data.objects
+    found = {pk: objects[pk] for pk in ids if pk in objects}
+    missing = set(ids) - found.keys()
+    if missing:
+        found.update(queryset.in_bulk(missing))
+        missing -= found.keys()
+    if missing:
+        raise serializers.ValidationError(
+            f'{queryset.model._meta.verbose_name_plural} с id '
+            f'{", ".join(map(str, sorted(missing)))} не существуют')
+    return [found[pk] for pk in ids]
+
+
+class ReferenceManyRelatedField(serializers.ManyRelatedField):
+    """Проверяет весь список id одним обращением к справочнику"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        ids = [self.child_relation.to_primary_key(item) for item in data]
+        return get_objects_by_ids(self.child_relation.reference_data,
+                                  self.child_relation.get_queryset(), ids)
+
+
+class ReferencePrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Берет объекты из справочника в памяти процесса.
+
+    В базу обращается только за id, которых в справочнике нет.
+    """
+
+    def __init__(self, reference_data, **kwargs):
+        self.reference_data = reference_data
+        super().__init__(**kwargs)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return ReferenceManyRelatedField(**list_kwargs)
+
+    def to_primary_key(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+    def to_internal_value(self, data):
+        return get_objects_by_ids(self.reference_data, self.get_queryset(),
+                                  [self.to_primary_key(data)])[0]
+
+
+class RenditionImageField(serializers.ImageField):
+    """Адрес уменьшенной копии изображения рецепта.
+
+    Копию выбирает image_rendition из контекста или аргумент rendition,
+    пока копия не готова, отдается оригинал.
+    """
+
+    def __init__(self, rendition=None, **kwargs):
+        self.rendition = rendition
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        rendition = self.context.get('image_rendition', self.rendition)
+        image = value.image
+        if rendition is not None:
+            image = getattr(value, RENDITION_FIELDS[rendition]) or image
+        return super().to_representation(image)
+
+
+class StreamingBase64ImageField(Base64ImageField):
+    """Изображение в base64, которое декодируется частями во временный файл.
+
+    Размер проверяется по длине строки до декодирования, а Pillow читает
+    только заголовок файла с диска, не загружая пиксели в память.
+    """
+    default_error_messages = {
+        'too_large': 'Размер изображения больше {max_size} МБ',
+        'too_many_pixels': 'Изображение больше {max_pixels} мегапикселей',
+        'invalid_base64': 'Изображение должно быть строкой data:image/...;'
+                          'base64,...',
+        'invalid_format': 'Допустимые форматы изображений: {formats}',
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.file = None
+
+    def close(self):
+        """Удаляет временный файл, если хранилище не перенесло его к себе"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _decode(self, data):
+        if not isinstance(data, str) or not data.startswith('data:'):
+            return super()._decode(data)
+        separator = data.find(';base64,')
+        if separator == -1:
+            self.fail('invalid_base64')
+        content_type = data[len('data:'):separator].lower()
+        extension = settings.RECIPE_IMAGE_FORMATS.get(content_type)
+        if extension is None:
+            self.fail('invalid_format',
+                      formats=', '.join(settings.RECIPE_IMAGE_FORMATS))
+        start = separator + len(';base64,')
+        if (len(data) - start) // 4 * 3 > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail('too_large',
+                      max_size=settings.RECIPE_IMAGE_MAX_SIZE // 1024 ** 2)
+        # Некоторые клиенты переносят base64 по 76 символов в строке
+        if any(char.isspace() for char in data[start:start + 100]):
+            data, start = ''.join(data[start:].split()), 0
+        file = TemporaryUploadedFile(
+            f'{uuid.uuid4()}.{extension}', content_type, 0, None)
+        try:
+            for position in range(start, len(data), BASE64_CHUNK_SIZE):
+                file.write(b64decode(
+                    data[position:position + BASE64_CHUNK_SIZE],
+                    validate=True))
+        except (binascii.Error, ValueError):
+            file.close()
+            self.fail('invalid_base64')
+        file.size = file.tell()
+        file.seek(0)
+        self.file = file
+        return file
+
+    def to_internal_value(self, data):
+        file = super().to_internal_value(data)
+        width, height = file.image.size
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            self.fail('too_many_pixels',
+                      max_pixels=settings.RECIPE_IMAGE_MAX_PIXELS // 10 ** 6)
+        return file
@@ -1,22 +1,33 @@
-from django_filters.rest_framework import (FilterSet,
-                                           ModelMultipleChoiceFilter,
-                                           NumberFilter)
-from recipes.models import Recipe, Tag
+from django.db.models import Exists, OuterRef
+from django_filters.rest_framework import (ChoiceFilter, FilterSet,
+                                           MultipleChoiceFilter, NumberFilter)
+from recipes.models import Recipe
+
+from . import reference
+
+RecipeTag = Recipe.tags.through
+
+
+def get_tag_choices():
+    return [(tag['slug'], tag['name']) for tag in reference.tags.data]
 
 
 class RecipeFilter(FilterSet):
     author = NumberFilter(field_name='author__id')
     is_favorited = NumberFilter(method='get_favorite_recipes')
     is_in_shopping_cart = NumberFilter(method='get_shopping_cart')
-    tags = ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
-    )
+    tags = MultipleChoiceFilter(choices=get_tag_choices,
+                                method='get_recipes_with_tags')
+    tags_mode = ChoiceFilter(choices=(('any', 'any'), ('all', 'all')),
+                             method='skip_filter')
+    ordering = ChoiceFilter(
+        choices=(('popular', 'popular'), ('trending', 'trending')),
+        method='order_by_score')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'is_favorited', 'is_in_shopping_cart', 'tags')
+        fields = ('author', 'is_favorited', 'is_in_shopping_cart', 'tags',
+                  'tags_mode', 'ordering')
 
     def get_favorite_recipes(self, queryset, name, value):
         user = self.request.user
@@ -29,3 +40,28 @@ class RecipeFilter(FilterSet):
         if value and user.is_authenticated:
             return queryset.filter(shopping_cart__id=user.id)
         return queryset
+
+    def get_recipes_with_tags(self, queryset, name, value):
+        """Рецепты с любым из тегов или, при tags_mode=all, со всеми"""
+        tag_ids = {tag['slug']: tag['id'] for tag in reference.tags.data}
+        tag_ids = [tag_ids[slug] for slug in value]
+        if self.form.cleaned_data.get('tags_mode') == 'all':
+            for tag_id in tag_ids:
+                queryset = queryset.filter(Exists(RecipeTag.objects.filter(
+                    recipe_id=OuterRef('pk'), tag_id=tag_id)))
+            return queryset
+        return queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe_id=OuterRef('pk'), tag_id__in=tag_ids)))
+
+    def skip_filter(self, queryset, name, value):
+        return queryset
+
+    def order_by_score(self, queryset, name, value):
+        """Порядок совпадает с индексом оценки.
+
+        Оценка есть у каждого рецепта, поэтому соединение внутреннее.
+        """
+        score = {'popular': 'score__popularity',
+                 'trending': 'score__trending'}[value]
+        return queryset.filter(score__isnull=False).order_by(
+            f'-{score}', '-score__recipe_id')
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import time
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, generate_latest)
+from prometheus_client.multiprocess import MultiProcessCollector
+from recipes.metrics import (REQUEST_DURATION, REQUEST_QUERIES, REQUESTS,
+                             REQUESTS_IN_PROGRESS, SHOPPING_CART_EXPORT_BYTES)
+
+query_counter = ContextVar('query_counter', default=None)
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+
+
+def count_queries(execute, sql, params, many, context):
+    counter = query_counter.get()
+    if counter is not None:
+        counter.count += 1
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created, dispatch_uid='api_count_queries')
+def install_counter(sender, connection, **kwargs):
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+def get_route(request):
+    """Имя маршрута, у viewsets в нем есть действие: recipes-favorite"""
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unmatched'
+
+
+class MetricsMiddleware:
+    """Число, время и запросы к базе по маршрутам"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        counter = QueryCounter()
+        token = query_counter.set(counter)
+        started = time.perf_counter()
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            response = self.get_response(request)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            query_counter.reset(token)
+        self.observe(request, response, counter, started)
+        return response
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        token = query_counter.set(counter)
+        started = time.perf_counter()
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            response = await self.get_response(request)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            query_counter.reset(token)
+        self.observe(request, response, counter, started)
+        return response
+
+    @staticmethod
+    def observe(request, response, counter, started):
+        route = get_route(request)
+        REQUESTS.labels(route, request.method, response.status_code).inc()
+        REQUEST_DURATION.labels(route, request.method).observe(
+            time.perf_counter() - started)
+        REQUEST_QUERIES.labels(route).observe(counter.count)
+
+
+def count_export_bytes(chunks, export_format):
+    """Отдает части ответа и учитывает размер выгрузки после отдачи"""
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        yield chunk
+    SHOPPING_CART_EXPORT_BYTES.labels(export_format).observe(size)
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry),
+                        content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,125 @@
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from recipes.cache import version_timestamp
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+from . import response_cache
+from .profiling import serializer_data
+
+
+def conditional_response(request, version, get_response):
+    """Ответ get_response() или 304 по версии данных в ETag"""
+    etag = quote_etag(version)
+    last_modified = int(version_timestamp(version).timestamp())
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = get_response()
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+class ReferenceDataMixin:
+    """Список и отдельные объекты из справочника в памяти процесса.
+
+    Ответы помечаются версией справочника в ETag и Last-Modified,
+    поэтому повторные запросы клиента получают 304.
+    """
+    reference_data = None
+
+    def reference_response(self, request, data):
+        return conditional_response(
+            request, self.reference_data.version, lambda: Response(data))
+
+    def list(self, request, *args, **kwargs):
+        return self.reference_response(request, self.reference_data.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        data = self.reference_data.get_data(kwargs[self.lookup_field])
+        if data is None:
+            raise NotFound
+        return self.reference_response(request, data)
+
+
+class CursorPaginationMixin:
+    """Пагинация курсором по запросу с параметром pagination=cursor.
+
+    Курсор не делает OFFSET и не считает общее количество объектов.
+    """
+    cursor_pagination_class = None
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if (self.cursor_pagination_class is not None
+                    and self.request.query_params.get(
+                        'pagination') == 'cursor'):
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+
+
+class AnonymousResponseCacheMixin:
+    """Кеширует список и отдельные объекты для анонимных пользователей.
+
+    Ключи содержат версии данных, которые меняют сигналы моделей,
+    поэтому устаревшие ответы не удаляются, а перестают находиться.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        key, data = response_cache.get_cached_list(request)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            response_cache.set_cached_list(key, data)
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().retrieve(request, *args, **kwargs)
+        pk = kwargs[self.lookup_field]
+        data = response_cache.get_cached_detail(request, pk)
+        if data is None:
+            data = super().retrieve(request, *args, **kwargs).data
+            response_cache.set_cached_detail(
+                request, pk, data['author']['id'], data)
+        return Response(data)
+
+
+class ValuesReadMixin:
+    """Список и отдельные объекты из строк .values() без моделей.
+
+    Ответ собирает values_serializer_class, остальные действия и формы
+    браузерного API работают с моделями и обычными сериализаторами.
+    """
+    values_serializer_class = None
+
+    def get_values_queryset(self):
+        return self.values_serializer_class.get_queryset(
+            self.filter_queryset(self.get_queryset()))
+
+    def get_values_serializer(self, *args, **kwargs):
+        kwargs['context'] = self.get_serializer_context()
+        return self.values_serializer_class(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_values_queryset()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_values_serializer(page, many=True)
+            return self.get_paginated_response(serializer_data(serializer))
+        serializer = self.get_values_serializer(queryset, many=True)
+        return Response(serializer_data(serializer))
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(
+            self.get_values_queryset(),
+            **{self.lookup_field: kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(request, row)
+        return Response(serializer_data(self.get_values_serializer(row)))
@@ -0,0 +1,92 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from recipes.metrics import cache_lookup
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from . import response_cache
+
+
+class CachedCountPaginator(Paginator):
+    """Хранит общее количество объектов в кеше, чтобы не считать
+    COUNT(*) со всеми фильтрами на каждой странице.
+
+    Ключ содержит те же версии, что и кеш ленты, поэтому созданный или
+    удаленный рецепт сразу меняет количество, а закешированная лента не
+    получает количество от старых версий.
+    """
+
+    def __init__(self, object_list, per_page, cache_count=True, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.cache_count = cache_count
+
+    def get_count_key(self, versions):
+        query = str(self.object_list.query).encode()
+        return f'pagination:count:{versions}:{md5(query).hexdigest()}'
+
+    @cached_property
+    def count(self):
+        if not self.cache_count:
+            return super().count
+        key = self.get_count_key(response_cache.get_list_versions())
+        count = cache_lookup('pagination_count', cache.get(key))
+        if count is None:
+            count = super().count
+            cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
+    async def acount(self):
+        """Заполняет count асинхронным ORM для асинхронных views"""
+        if 'count' not in self.__dict__:
+            count = None
+            if self.cache_count:
+                key = self.get_count_key(
+                    await response_cache.aget_list_versions())
+                count = cache_lookup('pagination_count',
+                                     await cache.aget(key))
+            if count is None:
+                count = await self.object_list.acount()
+                if self.cache_count:
+                    await cache.aset(key, count,
+                                     settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+            self.__dict__['count'] = count
+        return self.count
+
+
+class CachedCountPageNumberPagination(PageNumberPagination):
+    # Избранное и список покупок пользователя не меняют версий ленты,
+    # с этими фильтрами количество считается в каждом запросе
+    uncached_count_params = ('is_favorited', 'is_in_shopping_cart')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        return super().paginate_queryset(queryset, request, view)
+
+    def django_paginator_class(self, object_list, per_page):
+        cache_count = not any(self.request.GET.get(param)
+                              for param in self.uncached_count_params)
+        return CachedCountPaginator(object_list, per_page,
+                                    cache_count=cache_count)
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Курсор строится по дате публикации рецепта.
+
+    Сортировку по оценкам курсор не поддерживает, поэтому вместе с
+    параметром ordering запрос отклоняется.
+    """
+    ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get('ordering'):
+            raise ValidationError({'ordering': [
+                'Сортировка недоступна при pagination=cursor']})
+        return super().paginate_queryset(queryset, request, view)
+
+
+class SubscriptionCursorPagination(CursorPagination):
+    ordering = ('-date_joined', '-id')
@@ -0,0 +1,26 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import JSONParser
+
+
+class RequestTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Размер запроса больше {max_size} МБ'
+    default_code = 'request_too_large'
+
+
+class LimitedJSONParser(JSONParser):
+    """Отклоняет слишком большие тела запросов до чтения и разбора JSON"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = (parser_context or {}).get('request')
+        if request is not None:
+            try:
+                length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                length = 0
+            if length > settings.API_JSON_MAX_BODY_SIZE:
+                raise RequestTooLarge(RequestTooLarge.default_detail.format(
+                    max_size=settings.API_JSON_MAX_BODY_SIZE // 1024 ** 2))
+        return super().parse(stream, media_type, parser_context)
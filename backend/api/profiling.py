@@ -0,0 +1,181 @@
+"""Профилирование запросов к базе на выборке запросов к серверу.
+
+Для PROFILING_SAMPLE_RATE запросов считает число и время запросов к
+базе, повторяющиеся запросы (признак N+1), время сериализаторов,
+время отрисовки ответа и его размер. Результат пишется в лог
+api.profiling одной строкой JSON и, если включено
+PROFILING_SERVER_TIMING, в заголовок Server-Timing.
+"""
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from hashlib import md5
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+current_profile = ContextVar('current_profile', default=None)
+
+IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+NUMBER = re.compile(r'\b\d+\b')
+
+
+def get_fingerprint(sql):
+    """SQL без чисел и с одинаковыми списками IN"""
+    return NUMBER.sub('?', IN_LIST.sub('(...)', sql))
+
+
+class Profile:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = Counter()
+        self.db_time = 0
+        self.serializer_time = 0
+        self.in_serializer = False
+        self.render_started = None
+        self.render_time = 0
+
+    def add_query(self, sql, duration):
+        self.queries[get_fingerprint(sql)] += 1
+        self.db_time += duration
+        if duration * 1000 >= settings.PROFILING_SLOW_QUERY_MS:
+            logger.warning(json.dumps(
+                {'event': 'slow_query', 'duration_ms': round(
+                    duration * 1000, 3), 'sql': sql}, ensure_ascii=False))
+
+    def get_duplicates(self):
+        return [
+            {'fingerprint': md5(sql.encode()).hexdigest()[:12],
+             'count': count, 'sql': sql[:200]}
+            for sql, count in self.queries.most_common() if count > 1]
+
+
+def profile_queries(execute, sql, params, many, context):
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, time.perf_counter() - started)
+
+
+@receiver(connection_created, dispatch_uid='api_profile_queries')
+def install_wrapper(sender, connection, **kwargs):
+    """Обертка ставится на соединение, а не на запрос, чтобы видеть
+    запросы асинхронных views из потоков sync_to_async"""
+    if (settings.PROFILING_SAMPLE_RATE
+            and profile_queries not in connection.execute_wrappers):
+        connection.execute_wrappers.append(profile_queries)
+
+
+def serializer_data(serializer):
+    """serializer.data с учетом времени в профиле запроса.
+
+    Запросы к базе внутри сериализатора, например ленивый queryset,
+    остаются во времени базы.
+    """
+    profile = current_profile.get()
+    if profile is None or profile.in_serializer:
+        return serializer.data
+    started = time.perf_counter()
+    db_time = profile.db_time
+    profile.in_serializer = True
+    try:
+        return serializer.data
+    finally:
+        profile.in_serializer = False
+        profile.serializer_time += (time.perf_counter() - started
+                                    - (profile.db_time - db_time))
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+        profile = request._profile = Profile()
+        token = current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return await self.get_response(request)
+        profile = request._profile = Profile()
+        token = current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.finish(request, response, profile)
+
+    def process_template_response(self, request, response):
+        """Ответы DRF отрисовываются после view, время отрисовки
+        отделяется от времени view и сериализаторов"""
+        profile = getattr(request, '_profile', None)
+        if profile is not None:
+            profile.render_started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda response: self.rendered(profile))
+        return response
+
+    @staticmethod
+    def rendered(profile):
+        profile.render_time = time.perf_counter() - profile.render_started
+
+    def finish(self, request, response, profile):
+        total = time.perf_counter() - profile.started
+        timings = {
+            'db': profile.db_time,
+            'serializer': profile.serializer_time,
+            'render': profile.render_time,
+            'app': (total - profile.db_time - profile.serializer_time
+                    - profile.render_time),
+            'total': total,
+        }
+        record = {
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': sum(profile.queries.values()),
+            **{f'{name}_ms': round(value * 1000, 3)
+               for name, value in timings.items()},
+            'response_bytes': (None if response.streaming
+                               else len(response.content)),
+            'duplicates': profile.get_duplicates(),
+        }
+        logger.info(json.dumps(record, ensure_ascii=False))
+        if settings.PROFILING_SERVER_TIMING:
+            response['Server-Timing'] = ', '.join(
+                f'{name};dur={value * 1000:.3f}'
+                + (f';desc="{record["queries"]} queries"'
+                   if name == 'db' else '')
+                for name, value in timings.items())
+        return response
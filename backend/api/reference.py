@@ -0,0 +1,74 @@
+from contextvars import ContextVar
+
+from recipes.cache import aget_version, get_version
+from recipes.models import Ingredient, Tag
+
+# Справочники, загруженные в текущем асинхронном запросе
+request_states = ContextVar('reference_request_states', default={})
+
+
+class ReferenceData:
+    """Справочник, целиком хранящийся в памяти процесса.
+
+    Содержит сериализованный список и словарь id -> объект модели.
+    Перестраивается, когда сигналы модели меняют версию name в кеше,
+    а без общего кеша еще и когда версия в кеше процесса устаревает.
+    """
+
+    def __init__(self, name, model, fields):
+        self.name = name
+        self.model = model
+        self.fields = fields
+        self._state = (None, [], {})
+
+    def _set_state(self, version, objects):
+        data = [{field: getattr(obj, field) for field in self.fields}
+                for obj in objects]
+        self._state = (version, data, {obj.id: obj for obj in objects})
+
+    def _load(self):
+        state = request_states.get().get(self.name)
+        if state is not None:
+            return state
+        version = get_version(self.name)
+        if self._state[0] != version:
+            self._set_state(version, list(self.model.objects.order_by('id')))
+        return self._state
+
+    async def aload(self):
+        """Перестраивает справочник асинхронным ORM в асинхронных views.
+
+        Загруженное состояние используется до конца запроса, чтобы
+        свойства справочника не обращались к кешу из цикла событий.
+        """
+        version = await aget_version(self.name)
+        if self._state[0] != version:
+            objects = self.model.objects.order_by('id')
+            self._set_state(version, [obj async for obj in objects])
+        request_states.set({**request_states.get(), self.name: self._state})
+
+    @property
+    def version(self):
+        return self._load()[0]
+
+    @property
+    def data(self):
+        return self._load()[1]
+
+    @property
+    def objects(self):
+        return self._load()[2]
+
+    def get_data(self, pk):
+        try:
+            obj = self.objects.get(int(pk))
+        except (TypeError, ValueError):
+            return None
+        if obj is None:
+            return None
+        return {field: getattr(obj, field) for field in self.fields}
+
+
+tags = ReferenceData('tags', Tag, ('id', 'name', 'color', 'slug'))
+ingredients = ReferenceData(
+    'ingredients', Ingredient, ('id', 'name', 'measurement_unit'))
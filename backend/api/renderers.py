@@ -0,0 +1,36 @@
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from rest_framework.renderers import JSONRenderer
+
+ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+                  if orjson else None)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson, если пакет установлен.
+
+    Даты, Decimal и ленивые строки кодирует JSONEncoder DRF, поэтому
+    ответ совпадает с ответом JSONRenderer. Ответы с отступом из
+    заголовка Accept, не UTF-8 и то, что orjson не кодирует, например
+    слишком большие числа, отдает JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii
+                or not self.compact
+                or self.get_indent(accepted_media_type,
+                                   renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        try:
+            content = orjson.dumps(data, default=self.encoder_class().default,
+                                   option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        # Как и JSONRenderer, разделители строк экранируются для JavaScript
+        return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,107 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from recipes.cache import aget_version, get_version
+from recipes.metrics import cache_lookup
+
+LIST_VERSIONS = ('recipes', 'tags', 'ingredients', 'recipe_scores')
+DETAIL_VERSIONS = ('tags', 'ingredients')
+
+
+def normalize_query(request):
+    """Параметры запроса без учета порядка, page=1 равен отсутствию page"""
+    params = []
+    for key in sorted(request.GET):
+        values = sorted(request.GET.getlist(key))
+        if key == 'page' and values == ['1']:
+            continue
+        params.append(f'{key}={",".join(values)}')
+    return '&'.join(params)
+
+
+def get_list_versions():
+    return ':'.join(get_version(name) for name in LIST_VERSIONS)
+
+
+async def aget_list_versions():
+    return ':'.join([await aget_version(name) for name in LIST_VERSIONS])
+
+
+def get_list_key(request, versions):
+    query = (f'{request.scheme}://{request.get_host()}'
+             f'?{normalize_query(request)}')
+    return f'recipes:list:{versions}:{md5(query.encode()).hexdigest()}'
+
+
+def get_detail_key(request, pk, versions):
+    host = md5(f'{request.scheme}://{request.get_host()}'.encode())
+    return f'recipes:detail:{pk}:{versions}:{host.hexdigest()}'
+
+
+def get_detail_versions(pk):
+    return ':'.join(
+        get_version(name) for name in (f'recipe:{pk}', *DETAIL_VERSIONS))
+
+
+async def aget_detail_versions(pk):
+    return ':'.join([await aget_version(name)
+                     for name in (f'recipe:{pk}', *DETAIL_VERSIONS)])
+
+
+def get_cached_list(request):
+    """Ключ и данные ленты.
+
+    Ключ берется до сборки ответа: если версии сменятся, пока
+    собирается ответ, он сохранится под старыми версиями.
+    """
+    key = get_list_key(request, get_list_versions())
+    return key, cache_lookup('recipes_list', cache.get(key))
+
+
+async def aget_cached_list(request):
+    key = get_list_key(request, await aget_list_versions())
+    return key, cache_lookup('recipes_list', await cache.aget(key))
+
+
+def set_cached_list(key, data):
+    cache.set(key, data, settings.RECIPES_RESPONSE_CACHE_TIMEOUT)
+
+
+async def aset_cached_list(key, data):
+    await cache.aset(key, data, settings.RECIPES_RESPONSE_CACHE_TIMEOUT)
+
+
+def get_cached_detail(request, pk):
+    """Данные рецепта, если не менялись ни рецепт, ни профиль автора"""
+    entry = cache.get(get_detail_key(request, pk, get_detail_versions(pk)))
+    data = None
+    if entry is not None:
+        author_id, author_version, cached_data = entry
+        if get_version(f'user:{author_id}') == author_version:
+            data = cached_data
+    return cache_lookup('recipe_detail', data)
+
+
+async def aget_cached_detail(request, pk):
+    entry = await cache.aget(
+        get_detail_key(request, pk, await aget_detail_versions(pk)))
+    data = None
+    if entry is not None:
+        author_id, author_version, cached_data = entry
+        if await aget_version(f'user:{author_id}') == author_version:
+            data = cached_data
+    return cache_lookup('recipe_detail', data)
+
+
+def set_cached_detail(request, pk, author_id, data):
+    cache.set(get_detail_key(request, pk, get_detail_versions(pk)),
+              (author_id, get_version(f'user:{author_id}'), data),
+              settings.RECIPES_RESPONSE_CACHE_TIMEOUT)
+
+
+async def aset_cached_detail(request, pk, author_id, data):
+    await cache.aset(
+        get_detail_key(request, pk, await aget_detail_versions(pk)),
+        (author_id, await aget_version(f'user:{author_id}'), data),
+        settings.RECIPES_RESPONSE_CACHE_TIMEOUT)
@@ -1,9 +1,13 @@
 from django.contrib.auth import get_user_model, password_validation
-from drf_base64.fields import Base64ImageField
-from recipes.models import Ingredient, Recipe, Tag
+from recipes import membership
+from recipes.models import Ingredient, Recipe, RecipeIngredients, Tag
 from rest_framework import serializers
 from users.models import Following
 
+from . import reference
+from .fields import (ReferencePrimaryKeyRelatedField, RenditionImageField,
+                     StreamingBase64ImageField, get_objects_by_ids)
+
 User = get_user_model()
 
 
@@ -18,9 +22,9 @@ class UserSerializer(serializers.ModelSerializer):
                   'last_name', 'is_subscribed', 'password')
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        return (user.is_authenticated and
-                obj.followers.filter(id=user.id).exists())
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.id in membership.following.get(self.context['request'])
 
 
 class SetPasswordSerializer(serializers.Serializer):
@@ -43,7 +47,7 @@ class TagSerializer(serializers.ModelSerializer):
 
 
 class IngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(write_only=True)
     name = serializers.CharField(read_only=True)
     measurement_unit = serializers.CharField(read_only=True)
@@ -53,25 +57,41 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class RecipeIngredientReadSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient_id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit')
+
+    class Meta:
+        model = RecipeIngredients
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
 class RecipeWriteSerializer(serializers.ModelSerializer):
     ingredients = IngredientSerializer(many=True, required=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True, required=True)
-    image = Base64ImageField(required=True)
+    tags = ReferencePrimaryKeyRelatedField(
+        reference.tags, queryset=Tag.objects.all(), many=True, required=True)
+    image = StreamingBase64ImageField(required=True)
     name = serializers.CharField(max_length=200)
     cooking_time = serializers.IntegerField(min_value=1)
 
     class Meta:
         model = Recipe
-        exclude = ('favorited_by', 'author')
+        exclude = ('favorited_by', 'author', 'favorites_count',
+                   'in_carts_count', 'image_thumbnail', 'image_medium')
 
     def validate_ingredients(self, value):
         if not value:
             raise serializers.ValidationError('Поле обязательно')
-        ingredients_id = [ingredient['id'].id for ingredient in value]
+        ingredients_id = [ingredient['id'] for ingredient in value]
         if len(ingredients_id) != len(set(ingredients_id)):
             raise serializers.ValidationError(
                 'Повторяющиеся ингредиенты в рецепте')
+        ingredients = get_objects_by_ids(
+            reference.ingredients, Ingredient.objects.all(), ingredients_id)
+        for ingredient, obj in zip(value, ingredients):
+            ingredient['id'] = obj
         return value
 
     def validate_tags(self, value):
@@ -79,38 +99,47 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Поле обязательно')
         return value
 
+    def run_validation(self, data=serializers.empty):
+        """Закрывает временный файл изображения, если данные с ошибкой"""
+        try:
+            return super().run_validation(data)
+        except serializers.ValidationError:
+            self.fields['image'].close()
+            raise
+
+    def save(self, **kwargs):
+        """Закрывает временный файл, если изображение было в запросе"""
+        try:
+            return super().save(**kwargs)
+        finally:
+            self.fields['image'].close()
+
 
 class RecipeReadSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
-    ingredients = IngredientSerializer(many=True, read_only=True)
+    ingredients = RecipeIngredientReadSerializer(
+        source='recipeingredients_set', many=True, read_only=True)
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
+    image = RenditionImageField()
 
     class Meta:
         model = Recipe
-        exclude = ('favorited_by', 'pub_date')
+        fields = ('id', 'author', 'tags', 'ingredients', 'is_favorited',
+                  'is_in_shopping_cart', 'name', 'image', 'text',
+                  'cooking_time')
 
     def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        return (user.is_authenticated and
-                obj.favorited_by.filter(id=user.id).exists())
+        return obj.id in membership.favorites.get(self.context['request'])
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        return (user.is_authenticated and
-                user.shopping_cart.filter(id=obj.id).exists())
-
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        for ingredient in data['ingredients']:
-            amount = instance.recipeingredients_set.all().get(
-                ingredient_id=ingredient['id']).amount
-            ingredient['amount'] = amount
-        return data
+        return obj.id in membership.shopping_cart.get(self.context['request'])
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
+    image = RenditionImageField('thumbnail')
+
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
@@ -120,14 +149,21 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     def to_representation(self, obj):
         recipes_limit = self.context.get('recipes_limit')
         author_data = UserSerializer(obj, context=self.context).data
-        recipes = Recipe.objects.filter(author=obj)[:recipes_limit]
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            recipes = Recipe.objects.filter(author=obj)[:recipes_limit]
         recipes_data = RecipeShortSerializer(recipes, many=True).data
-        recipes_count = Recipe.objects.filter(author=obj).count()
         author_data['recipes'] = recipes_data
-        author_data['recipes_count'] = recipes_count
+        author_data['recipes_count'] = obj.recipes_count
         return author_data
 
 
+class SubscriptionsParamsSerializer(serializers.Serializer):
+    """Параметры списка подписок, пустое значение - без ограничения"""
+    recipes_limit = serializers.IntegerField(min_value=0, required=False)
+
+
 class FollowingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Following
@@ -0,0 +1,29 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    """Выход через token/logout, удаление токена или пользователя"""
+    user_id = instance.user_id
+    transaction.on_commit(lambda: token_cache.invalidate(user_id))
+
+
+@receiver(post_save, sender=User)
+def user_changed(instance, created, update_fields, **kwargs):
+    """Смена пароля, деактивация и правка профиля.
+
+    Вход обновляет только last_login, который из кеша не читается.
+    """
+    if created or (update_fields is not None
+                   and set(update_fields) <= {'last_login'}):
+        return
+    user_id = instance.pk
+    transaction.on_commit(lambda: token_cache.invalidate(user_id))
@@ -1,7 +1,10 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from .metrics import metrics_view
+from .views import (HealthView, IngredientViewSet, RecipeViewSet, TagViewSet,
+                    UserViewSet)
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet, basename='users')
@@ -10,5 +13,27 @@ router.register(r'ingredients', IngredientViewSet, basename='ingredients')
 router.register(r'recipes', RecipeViewSet, basename='recipes')
 
 urlpatterns = [
+    path('health/', HealthView.as_view(), name='health'),
+    path('metrics/', metrics_view, name='metrics'),
+]
+if settings.API_ASYNC_VIEWS:
+    from . import async_views
+
+    viewsets = {url.name: url.callback for url in router.urls}
+    urlpatterns += [
+        path(url, async_views.as_view(view, viewsets[name]), name=name)
+        for url, view, name in (
+            ('recipes/', async_views.recipe_list, 'recipes-list'),
+            ('recipes/<int:pk>/', async_views.recipe_detail,
+             'recipes-detail'),
+            ('tags/', async_views.tag_list, 'tags-list'),
+            ('tags/<int:pk>/', async_views.tag_detail, 'tags-detail'),
+            ('ingredients/', async_views.ingredient_list,
+             'ingredients-list'),
+            ('ingredients/<int:pk>/', async_views.ingredient_detail,
+             'ingredients-detail'),
+        )
+    ]
+urlpatterns += [
     path('', include(router.urls))
 ]
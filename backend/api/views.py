@@ -1,8 +1,15 @@
-import csv
+import time
 
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Prefetch, Value
+from django.http import StreamingHttpResponse
+from recipes import membership
+from recipes.counters import (FavoriteRecipe, ShoppingCartRecipe,
+                              add_relation, remove_relation)
+from recipes.images import (EMPTY_RENDITIONS, delete_renditions,
+                            get_renditions, schedule_renditions)
 from recipes.models import Ingredient, Recipe, RecipeIngredients, Tag
 from rest_framework import status
 from rest_framework.decorators import action
@@ -10,32 +17,49 @@ from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 from rest_framework.viewsets import (GenericViewSet, ModelViewSet,
                                      ReadOnlyModelViewSet, mixins)
+from users.models import Following
 
+from . import connections, reference
+from .autocomplete import autocomplete_ingredients, get_limit
+from .exporters import SHOPPING_CART_WRITERS, ExportContentNegotiation
 from .filters import RecipeFilter
+from .metrics import count_export_bytes
+from .mixins import (AnonymousResponseCacheMixin, CursorPaginationMixin,
+                     ReferenceDataMixin, ValuesReadMixin)
+from .pagination import (CachedCountPageNumberPagination,
+                         RecipeCursorPagination, SubscriptionCursorPagination)
 from .permissions import ListPostAllowAny, OwnerOrReadOnly
+from .profiling import serializer_data
 from .serializers import (FollowingSerializer, IngredientSerializer,
                           RecipeReadSerializer, RecipeShortSerializer,
                           RecipeWriteSerializer, SetPasswordSerializer,
-                          SubscriptionSerializer, TagSerializer,
+                          SubscriptionSerializer,
+                          SubscriptionsParamsSerializer, TagSerializer,
                           UserSerializer)
+from .values_serializers import (RecipeValuesSerializer,
+                                 SubscriptionValuesSerializer)
 
 User = get_user_model()
 
 
-class UserViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
-                  mixins.RetrieveModelMixin, GenericViewSet):
+class UserViewSet(CursorPaginationMixin, mixins.CreateModelMixin,
+                  mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                  GenericViewSet):
     """Получение и создание пользователей"""
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = (ListPostAllowAny,)
+    cursor_pagination_class = SubscriptionCursorPagination
 
     def perform_create(self, serializer):
         password = serializer.validated_data.pop('password')
         user = serializer.save()
         user.set_password(password)
-        user.save()
+        user.save(update_fields=('password',))
 
     @action(detail=False, methods=('get',),
             permission_classes=(IsAuthenticated,))
@@ -43,7 +67,7 @@ class UserViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
         """Получение информации о себе"""
         user = request.user
         serializer = self.get_serializer(user, context={'request': request})
-        return Response(serializer.data)
+        return Response(serializer_data(serializer))
 
     @action(detail=False, methods=('post',),
             permission_classes=(IsAuthenticated,),
@@ -56,23 +80,31 @@ class UserViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
         serializer.is_valid(raise_exception=True)
         new_password = serializer.validated_data['new_password']
         user.set_password(new_password)
-        user.save()
+        user.save(update_fields=('password',))
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    def get_subscriptions_queryset(user):
+        """Авторы из подписок, рецепты загружает сериализатор"""
+        return SubscriptionValuesSerializer.get_queryset(
+            user.following.
+            annotate(is_subscribed=Value(True)).
+            order_by('-date_joined'))
+
     @action(detail=False, methods=('get',),
             permission_classes=(IsAuthenticated,),
             serializer_class=SubscriptionSerializer,)
     def subscriptions(self, request):
         """Получение списка подписок на авторов"""
-        recipes_limit = self.request.GET.get('recipes_limit')
-        if recipes_limit:
-            recipes_limit = int(recipes_limit)
-        subscriptions = request.user.following.all()
+        params = SubscriptionsParamsSerializer(data=request.GET)
+        params.is_valid(raise_exception=True)
+        recipes_limit = params.validated_data.get('recipes_limit')
+        subscriptions = self.get_subscriptions_queryset(request.user)
         page = self.paginate_queryset(subscriptions)
-        serializer = self.get_serializer(
+        serializer = SubscriptionValuesSerializer(
             page, many=True,
             context={'request': request, 'recipes_limit': recipes_limit})
-        return self.get_paginated_response(serializer.data)
+        return self.get_paginated_response(serializer_data(serializer))
 
     @action(detail=True, methods=('post', 'delete'),
             permission_classes=(IsAuthenticated,),
@@ -85,127 +117,192 @@ class UserViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
             serializer = self.get_serializer(
                 data={'author': author.id, 'subscriber': user.id})
             serializer.is_valid(raise_exception=True)
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                membership.following.invalidate((user.id,))
             response = SubscriptionSerializer(author,
                                               context={'request': request})
-            return Response(response.data)
+            return Response(serializer_data(response))
         if request.method == 'DELETE':
             author = get_object_or_404(User, id=pk)
-            user = request.user
-            user.following.remove(author)
+            if remove_relation(Following, subscriber=request.user,
+                               author=author):
+                membership.following.invalidate((request.user.id,))
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(ReferenceDataMixin, ReadOnlyModelViewSet):
     """Получение информации о тегах"""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
+    reference_data = reference.tags
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(ReferenceDataMixin, ReadOnlyModelViewSet):
     """Получение информации об ингредиентах"""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
     search_fields = ('^name',)
+    reference_data = reference.ingredients
+
+    def list(self, request, *args, **kwargs):
+        """Автодополнение по параметру name с ограничением limit"""
+        query = request.query_params.get(api_settings.SEARCH_PARAM)
+        if not query:
+            return super().list(request, *args, **kwargs)
+        return self.reference_response(request, autocomplete_ingredients(
+            query, get_limit(request.query_params)))
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(AnonymousResponseCacheMixin, ValuesReadMixin,
+                    CursorPaginationMixin, ModelViewSet):
     """Получение и создание рецептов"""
     queryset = (Recipe.objects.
-                prefetch_related('ingredients', 'tags').
+                prefetch_related(
+                    Prefetch('recipeingredients_set',
+                             queryset=RecipeIngredients.objects.
+                             select_related('ingredient').
+                             order_by('ingredient_id')),
+                    'tags').
                 select_related('author'))
     permission_classes = (IsAuthenticatedOrReadOnly, OwnerOrReadOnly)
     filterset_class = RecipeFilter
+    pagination_class = CachedCountPageNumberPagination
+    cursor_pagination_class = RecipeCursorPagination
+    values_serializer_class = RecipeValuesSerializer
 
     def get_serializer_class(self):
         if self.action in ('retrieve', 'list'):
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'list':
+            context['image_rendition'] = 'medium'
+        return context
+
     @staticmethod
     def add_ingredients_in_recipe(ingredients_data, recipe):
-        recipe.ingredients.clear()
-        objects = [RecipeIngredients(
-            recipe=recipe,
-            ingredient=data['id'],
-            amount=data['amount']) for data in ingredients_data]
-        RecipeIngredients.objects.bulk_create(objects)
+        """Изменяет только добавленные, удаленные и измененные строки"""
+        existing = {recipe_ingredient.ingredient_id: recipe_ingredient
+                    for recipe_ingredient
+                    in recipe.recipeingredients_set.all()}
+        amounts = {data['id'].id: data['amount'] for data in ingredients_data}
+        removed = existing.keys() - amounts.keys()
+        if removed:
+            RecipeIngredients.objects.filter(
+                recipe=recipe, ingredient_id__in=removed).delete()
+        changed = []
+        for ingredient_id, recipe_ingredient in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        RecipeIngredients.objects.bulk_update(changed, ('amount',))
+        RecipeIngredients.objects.bulk_create(
+            RecipeIngredients(recipe=recipe, ingredient_id=ingredient_id,
+                              amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing)
 
     @staticmethod
     def add_tags_in_recipe(tags_data, recipe):
-        recipe.tags.clear()
-        tags = [tag.id for tag in tags_data]
-        recipe.tags.add(*tags)
+        recipe.tags.set(tags_data)
 
-    def create(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+    @transaction.atomic
+    def save_recipe(self, serializer):
         ingredients_data = serializer.validated_data.pop('ingredients')
         tags_data = serializer.validated_data.pop('tags')
-        recipe = serializer.save(author=self.request.user)
+        # Копии пересоздаются, только если изображение пришло в запросе
+        image_changed = 'image' in serializer.validated_data
+        old_renditions = {}
+        if image_changed and serializer.instance is not None:
+            old_renditions = get_renditions(serializer.instance)
+        recipe = serializer.save(
+            author=self.request.user,
+            **(EMPTY_RENDITIONS if image_changed else {}))
+        if image_changed:
+            schedule_renditions(recipe.id)
+            delete_renditions(old_renditions)
         self.add_ingredients_in_recipe(ingredients_data, recipe)
         self.add_tags_in_recipe(tags_data, recipe)
-        response = RecipeReadSerializer(
-            recipe, context={'request': self.request})
-        headers = self.get_success_headers(response.data)
+        return recipe
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe = self.save_recipe(serializer)
+        recipe = self.get_queryset().get(pk=recipe.pk)
+        data = serializer_data(RecipeReadSerializer(
+            recipe, context={'request': self.request}))
+        headers = self.get_success_headers(data)
         return Response(
-            response.data, status=status.HTTP_201_CREATED, headers=headers)
+            data, status=status.HTTP_201_CREATED, headers=headers)
 
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data)
         serializer.is_valid(raise_exception=True)
-        ingredients_data = serializer.validated_data.pop('ingredients')
-        tags_data = serializer.validated_data.pop('tags')
-        recipe = serializer.save(author=self.request.user)
-        self.add_ingredients_in_recipe(ingredients_data, recipe)
-        self.add_tags_in_recipe(tags_data, recipe)
-        response = RecipeReadSerializer(recipe,
-                                        context={'request': self.request})
-        headers = self.get_success_headers(response.data)
+        recipe = self.save_recipe(serializer)
+        recipe = self.get_queryset().get(pk=recipe.pk)
+        data = serializer_data(RecipeReadSerializer(
+            recipe, context={'request': self.request}))
+        headers = self.get_success_headers(data)
         return Response(
-            response.data, status=status.HTTP_201_CREATED, headers=headers)
+            data, status=status.HTTP_201_CREATED, headers=headers)
 
     @action(detail=True, methods=('post', 'delete'),
             permission_classes=(IsAuthenticated,))
     def shopping_cart(self, request, pk):
         """Добавление и удаление рецептов из списка покупок"""
         if request.method == 'POST':
-            user = request.user
             recipe = get_object_or_404(Recipe, id=pk)
-            user.shopping_cart.add(recipe)
+            if add_relation(ShoppingCartRecipe, user=request.user,
+                            recipe=recipe):
+                membership.shopping_cart.invalidate((request.user.id,))
             response = RecipeShortSerializer(recipe)
-            return Response(response.data)
+            return Response(serializer_data(response))
         if request.method == 'DELETE':
-            user = request.user
             recipe = get_object_or_404(Recipe, id=pk)
-            user.shopping_cart.remove(recipe)
+            if remove_relation(ShoppingCartRecipe, user=request.user,
+                               recipe=recipe):
+                membership.shopping_cart.invalidate((request.user.id,))
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
     @action(detail=False, methods=('get',),
-            permission_classes=(IsAuthenticated,))
+            permission_classes=(IsAuthenticated,),
+            content_negotiation_class=ExportContentNegotiation)
     def download_shopping_cart(self, request):
-        """Скачивание списка покупок в формате CSV"""
-        ingredients = (
-            request.user.shopping_cart.all().
-            values_list('recipeingredients__ingredient__name',
-                        'recipeingredients__ingredient__measurement_unit'
-                        ).annotate(total=Sum('recipeingredients__amount')))
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = ('attachment; '
-                                           'filename="shopping_cart.csv"')
-        writer = csv.DictWriter(
-            response, fieldnames=['Название', 'единица', 'количество'])
-        writer.writeheader()
-        for ingredient in ingredients:
-            row = dict(zip(writer.fieldnames, ingredient))
-            writer.writerow(row)
+        """Скачивание списка покупок в формате CSV, TXT, JSON или PDF"""
+        export_format = request.query_params.get('format', 'csv')
+        writer = SHOPPING_CART_WRITERS.get(export_format)
+        if writer is None:
+            return Response(
+                {'format': f'Доступные форматы: '
+                           f'{", ".join(SHOPPING_CART_WRITERS)}'},
+                status=status.HTTP_400_BAD_REQUEST)
+        writer = writer()
+        writer.prepare()
+        ingredients = (RecipeIngredients.objects.
+                       shopping_cart_totals(request.user))
+        # Django 4.1 reads a streaming response under ASGI in the event
+        # loop, where database queries are not allowed
+        ingredients = (list(ingredients)
+                       if isinstance(request._request, ASGIRequest)
+                       else ingredients.iterator())
+        response = StreamingHttpResponse(
+            writer.write(ingredients), content_type=writer.content_type)
+        response.streaming_content = count_export_bytes(
+            response.streaming_content, writer.format)
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{writer.format}"')
         return response
 
     @action(detail=True, methods=('post', 'delete'),
@@ -213,14 +310,35 @@ class RecipeViewSet(ModelViewSet):
     def favorite(self, request, pk):
         """Добавление у удаление рецептов из избранного"""
         if request.method == 'POST':
-            user = request.user
             recipe = get_object_or_404(Recipe, id=pk)
-            recipe.favorited_by.add(user)
+            if add_relation(FavoriteRecipe, user=request.user,
+                            recipe=recipe):
+                membership.favorites.invalidate((request.user.id,))
             response = RecipeShortSerializer(recipe)
-            return Response(response.data)
+            return Response(serializer_data(response))
         if request.method == 'DELETE':
-            user = request.user
             recipe = get_object_or_404(Recipe, id=pk)
-            recipe.favorited_by.remove(user)
+            if remove_relation(FavoriteRecipe, user=request.user,
+                               recipe=recipe):
+                membership.favorites.invalidate((request.user.id,))
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class HealthView(APIView):
+    """Проверка соединения с базой и статистика соединений процесса"""
+    permission_classes = (AllowAny,)
+    authentication_classes = ()
+
+    def get(self, request):
+        started = time.perf_counter()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except DatabaseError:
+            return Response({'status': 'unavailable'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        database = connections.get_stats()
+        database['latency_ms'] = round(
+            (time.perf_counter() - started) * 1000, 3)
+        return Response({'status': 'ok', 'database': database})
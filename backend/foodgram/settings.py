@@ -29,13 +29,15 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'djoser',
     'django_filters',
-    'debug_toolbar',
     'users.apps.UsersConfig',
-    'recipes.apps.RecipesConfig'
+    'recipes.apps.RecipesConfig',
+    'api.apps.ApiConfig'
 ]
 
 MIDDLEWARE = [
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'api.metrics.MetricsMiddleware',
+    'api.profiling.ProfilingMiddleware',
+    'api.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,10 +76,40 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        'CONN_HEALTH_CHECKS': (
+            os.getenv('DB_CONN_HEALTH_CHECKS', default='True') == 'True'),
+        # PgBouncer in transaction mode does not keep server-side cursors
+        # of iterator() between transactions
+        'DISABLE_SERVER_SIDE_CURSORS': (
+            os.getenv('DB_PGBOUNCER', default=False) == 'True'),
     }
 }
 
+# Cache
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+# Writes of one gunicorn worker are seen by the others only in a shared
+# backend, per-process caches keep data that must stay in sync short-lived
+CACHE_SHARED = CACHE_BACKEND not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+if CACHE_BACKEND == 'django.core.cache.backends.locmem.LocMemCache':
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', default=10000)),
+    }
+# Data versions are kept forever in a shared cache, a per-process cache
+# never hears of bumps made by other processes and expires them instead
+CACHE_VERSION_LOCAL_TIMEOUT = 5
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -98,16 +130,74 @@ AUTH_PASSWORD_VALIDATORS = [
 # DRF settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',),
+        'api.authentication.CachedTokenAuthentication',),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',),
     'DEFAULT_FILTER_BACKENDS': ('django_filters.rest_framework.DjangoFilterBackend',
                                 'rest_framework.filters.SearchFilter'),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PARSER_CLASSES': ('api.parsers.LimitedJSONParser',
+                               'rest_framework.parsers.FormParser',
+                               'rest_framework.parsers.MultiPartParser'),
+    'DEFAULT_RENDERER_CLASSES': ['api.renderers.FastJSONRenderer'],
     'PAGE_SIZE': 6,
     'SEARCH_PARAM': 'name'
 }
 
+# The browsable API is for development only
+if DEBUG:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append(
+        'rest_framework.renderers.BrowsableAPIRenderer')
+
+API_JSON_MAX_BODY_SIZE = 15 * 1024 ** 2
+
+# Responses from this size are compressed with brotli, if the package is
+# installed, or gzip
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 4
+
+TOKEN_CACHE_TIMEOUT = 5 * 60
+TOKEN_CACHE_LOCAL_TIMEOUT = 5
+TOKEN_CACHE_MAX_SIZE = 1000
+
+# Async read views for the ASGI server mode
+API_ASYNC_VIEWS = (os.getenv('API_ASYNC_VIEWS', default=False) == 'True')
+
+# The toolbar middleware is sync only and would run the whole middleware
+# chain, async views included, in threads
+if DEBUG and not API_ASYNC_VIEWS:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.insert(0, 'debug_toolbar.middleware.DebugToolbarMiddleware')
+
+# Request profiling for a share of requests from 0 to 1
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', default=0))
+PROFILING_SLOW_QUERY_MS = int(os.getenv('PROFILING_SLOW_QUERY_MS',
+                                        default=100))
+PROFILING_SERVER_TIMING = (
+    os.getenv('PROFILING_SERVER_TIMING', default=False) == 'True')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+PAGINATION_COUNT_CACHE_TIMEOUT = 30
+
+RECIPES_RESPONSE_CACHE_TIMEOUT = 10 * 60
+
+MEMBERSHIP_CACHE_TIMEOUT = 60 * 60
+
 
 # Internationalization
 LANGUAGE_CODE = 'ru-RU'
@@ -127,6 +217,40 @@ MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 
+# Ingredients autocomplete
+INGREDIENTS_AUTOCOMPLETE_LIMIT = 20
+INGREDIENTS_AUTOCOMPLETE_MAX_LIMIT = 100
+INGREDIENTS_AUTOCOMPLETE_CACHE_TIMEOUT = 60 * 60
+
+
+# Recipe popularity scores
+RECIPE_SCORE_FAVORITE_WEIGHT = 1.0
+RECIPE_SCORE_CART_WEIGHT = 0.5
+RECIPE_TRENDING_GRAVITY = 1.5
+RECIPE_TRENDING_WINDOW_DAYS = 30
+
+
+# Recipe image renditions
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+RECIPE_IMAGE_RENDITIONS = {'thumbnail': (320, 320), 'medium': (960, 960)}
+RECIPE_IMAGE_WEBP_QUALITY = 80
+RECIPE_IMAGE_MAX_SIZE = 10 * 1024 ** 2
+RECIPE_IMAGE_MAX_PIXELS = 40 * 10 ** 6
+RECIPE_IMAGE_FORMATS = {
+    'image/jpeg': 'jpg',
+    'image/jpg': 'jpg',
+    'image/png': 'png',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+}
+
+
+# Shopping cart export
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -7,7 +7,7 @@ urlpatterns = [
     path('api/auth/', include('djoser.urls.authtoken')),
     path('api/', include('api.urls')),
 ]
-if settings.DEBUG:
+if 'debug_toolbar' in settings.INSTALLED_APPS:
     urlpatterns += [
         path('__debug__/', include('debug_toolbar.urls')),
     ]
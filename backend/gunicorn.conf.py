@@ -0,0 +1,36 @@
+"""Настройки gunicorn.
+
+SERVER_MODE=asgi запускает приложение через воркеры uvicorn и включает
+асинхронные views чтения, по умолчанию используются синхронные воркеры.
+В режиме ASGI каждый запрос работает с базой в новом потоке, поэтому
+постоянные соединения по умолчанию выключены, пул держит PgBouncer.
+Метрики Prometheus всех воркеров складываются в PROMETHEUS_MULTIPROC_DIR.
+"""
+import os
+import shutil
+
+bind = os.getenv('GUNICORN_BIND', default='0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', default=3))
+
+if os.getenv('SERVER_MODE', default='wsgi') == 'asgi':
+    os.environ.setdefault('API_ASYNC_VIEWS', 'True')
+    os.environ.setdefault('DB_CONN_MAX_AGE', '0')
+    wsgi_app = 'foodgram.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram.wsgi:application'
+
+# Set before the workers import prometheus_client
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/foodgram-metrics')
+
+
+def on_starting(server):
+    """Метрики прошлого запуска не суммируются с новыми"""
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
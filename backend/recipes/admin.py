@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from recipes.images import EMPTY_RENDITIONS, schedule_renditions
 from recipes.models import Ingredient, Recipe, RecipeIngredients, Tag
 
 
@@ -19,16 +20,24 @@ class IngredientAdmin(admin.ModelAdmin):
 
 class RecipeAdmin(admin.ModelAdmin):
     inlines = (RecipeIngredientsInline,)
-    list_display = ('name', 'author', 'pub_date', 'favorites_count')
+    list_display = ('name', 'author', 'pub_date', 'favorites_count',
+                    'in_carts_count')
     list_filter = ('name', 'author', 'tags')
+    list_select_related = ('author',)
     search_fields = ('name',)
     ordering = ('-pub_date',)
     filter_horizontal = ('favorited_by',)
-
-    def favorites_count(self, obj):
-        return obj.favorited_by.all().count()
-
-    favorites_count.__name__ = 'Добавлений в избранное'
+    readonly_fields = ('favorites_count', 'in_carts_count',
+                       'image_thumbnail', 'image_medium')
+
+    def save_model(self, request, obj, form, change):
+        image_changed = 'image' in form.changed_data
+        if image_changed:
+            for field, value in EMPTY_RENDITIONS.items():
+                setattr(obj, field, value)
+        super().save_model(request, obj, form, change)
+        if image_changed:
+            schedule_renditions(obj.id)
 
 
 class RecipeIngredientsAdmin(admin.ModelAdmin):
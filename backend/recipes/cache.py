@@ -0,0 +1,51 @@
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def new_version():
+    return f'{time.time_ns():x}'
+
+
+def get_version_timeout():
+    """Версии в кеше процесса устаревают сами.
+
+    Смену версии в другом процессе, например в load_ingredients_data,
+    такой кеш не увидит, поэтому данные перестраиваются по новой
+    версии не реже раза в CACHE_VERSION_LOCAL_TIMEOUT секунд.
+    """
+    if settings.CACHE_SHARED:
+        return None
+    return settings.CACHE_VERSION_LOCAL_TIMEOUT
+
+
+def get_version(name):
+    """Текущая версия закешированных данных name"""
+    key = f'{name}:version'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, new_version(), get_version_timeout())
+        return cache.get(key)
+    return version
+
+
+async def aget_version(name):
+    """get_version для асинхронных views"""
+    key = f'{name}:version'
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, new_version(), get_version_timeout())
+        return await cache.aget(key)
+    return version
+
+
+def bump_version(name):
+    """Делает устаревшими все записи кеша, построенные по версии name"""
+    cache.set(f'{name}:version', new_version(), get_version_timeout())
+
+
+def version_timestamp(version):
+    """Время смены версии, версия хранит его в наносекундах"""
+    return datetime.fromtimestamp(int(version, 16) / 10 ** 9, timezone.utc)
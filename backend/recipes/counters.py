@@ -0,0 +1,182 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import (m2m_changed, post_delete, post_init,
+                                      post_save, pre_delete)
+from users.models import Following, User
+
+from recipes.models import Recipe
+
+FavoriteRecipe = Recipe.favorited_by.through
+ShoppingCartRecipe = User.shopping_cart.through
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно изменяет счетчик на delta, не опуская его ниже нуля"""
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)})
+
+
+def count_subquery(model, field):
+    """Количество строк model, у которых field ссылается на внешний pk"""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).
+        order_by().values(field).annotate(count=Count('*')).
+        values('count')), 0)
+
+
+class RelationCounter:
+    """Счетчик field у model - число строк through с внешним ключом fk.
+
+    Сигналы меняют его при записи через API, админку, shell или
+    фикстуры. Одиночные строки меняют счетчик на единицу, изменения m2m,
+    фикстуры и удаление второго объекта связи пересчитывают затронутые
+    объекты целиком.
+    m2m - поле ManyToManyField с промежуточной моделью through.
+    """
+
+    def __init__(self, through, fk, model, field, m2m=None):
+        self.through = through
+        self.fk = fk
+        self.attname = f'{fk}_id'
+        self.loaded_attr = f'_loaded_{self.attname}'
+        self.model = model
+        self.field = field
+        self.m2m = m2m
+
+    def change(self, pk, delta):
+        change_counter(self.model, pk, self.field, delta)
+
+    def recount(self, pks):
+        self.model.objects.filter(pk__in=pks).update(**self.get_recount())
+
+    def get_recount(self):
+        """Аргументы update() для пересчета счетчика"""
+        return {self.field: count_subquery(self.through, self.fk)}
+
+    def connect(self):
+        uid = f'counter_{self.field}'
+        if self.through._meta.auto_created:
+            # Строки автоматических промежуточных моделей Django сохраняет и
+            # удаляет без сигналов: API меняет счетчик в add_relation и
+            # remove_relation, удаление второго объекта связи - здесь
+            other = self.through._meta.get_field(self.get_other_fk())
+            pre_delete.connect(self.other_deleting,
+                               sender=other.related_model, dispatch_uid=uid)
+            post_delete.connect(self.other_deleted,
+                                sender=other.related_model, dispatch_uid=uid)
+        else:
+            post_init.connect(self.initialized, sender=self.through,
+                              dispatch_uid=uid)
+            post_save.connect(self.saved, sender=self.through,
+                              dispatch_uid=uid)
+            post_delete.connect(self.deleted, sender=self.through,
+                                dispatch_uid=uid)
+        if self.m2m is not None:
+            m2m_changed.connect(self.m2m_changed, sender=self.through,
+                                dispatch_uid=uid)
+
+    def get_other_fk(self):
+        return next(name for name in (self.m2m.m2m_field_name(),
+                                      self.m2m.m2m_reverse_field_name())
+                    if name != self.fk)
+
+    def initialized(self, instance, **kwargs):
+        """Запоминает загруженный ключ, чтобы заметить его замену"""
+        instance.__dict__[self.loaded_attr] = instance.__dict__.get(
+            self.attname)
+
+    def saved(self, instance, created, raw, **kwargs):
+        pk = getattr(instance, self.attname)
+        loaded = instance.__dict__.get(self.loaded_attr)
+        if raw:
+            self.recount({pk, loaded} - {None})
+        elif created:
+            self.change(pk, 1)
+        elif loaded is not None and loaded != pk:
+            self.change(loaded, -1)
+            self.change(pk, 1)
+        instance.__dict__[self.loaded_attr] = pk
+
+    def deleted(self, instance, origin, **kwargs):
+        """Удаление самого объекта счетчика его не меняет"""
+        pk = getattr(instance, self.attname)
+        if not (isinstance(origin, self.model) and origin.pk == pk):
+            self.change(pk, -1)
+
+    def other_deleting(self, instance, **kwargs):
+        instance.__dict__[f'_deleted_{self.field}'] = list(
+            self.through.objects.
+            filter(**{self.get_other_fk(): instance.pk}).
+            values_list(self.attname, flat=True))
+
+    def other_deleted(self, instance, **kwargs):
+        self.recount(instance.__dict__.pop(f'_deleted_{self.field}', ()))
+
+    def get_affected(self, instance, reverse, pk_set):
+        """pk объектов model, у которых изменились связи с instance"""
+        instance_fk = (self.m2m.m2m_reverse_field_name() if reverse
+                       else self.m2m.m2m_field_name())
+        if instance_fk == self.fk:
+            return (instance.pk,)
+        if pk_set is not None:
+            return pk_set
+        return list(self.through.objects.
+                    filter(**{instance_fk: instance.pk}).
+                    values_list(self.attname, flat=True))
+
+    def m2m_changed(self, instance, action, reverse, pk_set, **kwargs):
+        attr = f'_cleared_{self.field}'
+        if action == 'pre_clear':
+            instance.__dict__[attr] = self.get_affected(
+                instance, reverse, None)
+        elif action == 'post_clear':
+            self.recount(instance.__dict__.pop(attr, ()))
+        elif action in ('post_add', 'post_remove') and pk_set:
+            self.recount(self.get_affected(instance, reverse, pk_set))
+
+
+COUNTERS = (
+    RelationCounter(Recipe, 'author', User, 'recipes_count'),
+    RelationCounter(Following, 'author', User, 'followers_count',
+                    User.following.field),
+    RelationCounter(FavoriteRecipe, 'recipe', Recipe, 'favorites_count',
+                    Recipe.favorited_by.field),
+    RelationCounter(ShoppingCartRecipe, 'recipe', Recipe, 'in_carts_count',
+                    User.shopping_cart.field),
+)
+COUNTERS_BY_THROUGH = {counter.through: counter for counter in COUNTERS}
+
+
+def add_relation(through, **lookup):
+    """Создает связь, если ее еще не было.
+
+    Счетчики автоматических промежуточных моделей меняются здесь,
+    остальные - сигналами.
+    """
+    with transaction.atomic():
+        _, created = through.objects.get_or_create(**lookup)
+        counter = COUNTERS_BY_THROUGH[through]
+        if created and through._meta.auto_created:
+            counter.change(lookup[counter.fk].pk, 1)
+    return created
+
+
+def remove_relation(through, **lookup):
+    """Удаляет связь и возвращает число удаленных строк"""
+    with transaction.atomic():
+        deleted, _ = through.objects.filter(**lookup).delete()
+        counter = COUNTERS_BY_THROUGH[through]
+        if deleted and through._meta.auto_created:
+            counter.change(lookup[counter.fk].pk, -deleted)
+    return deleted
+
+
+def recount_counters():
+    """Пересчитывает все счетчики по связанным таблицам"""
+    updates = {}
+    for counter in COUNTERS:
+        updates.setdefault(counter.model, {}).update(counter.get_recount())
+    with transaction.atomic():
+        for model, fields in updates.items():
+            model.objects.update(**fields)
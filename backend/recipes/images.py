@@ -0,0 +1,122 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, connections, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from recipes.cache import bump_version
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITION_FIELDS = {'thumbnail': 'image_thumbnail', 'medium': 'image_medium'}
+EMPTY_RENDITIONS = dict.fromkeys(RENDITION_FIELDS.values(), '')
+
+_executor = None
+
+
+def make_rendition(image, size):
+    """Уменьшенная копия изображения в формате WebP"""
+    rendition = image.copy()
+    rendition.thumbnail(size)
+    if rendition.mode not in ('RGB', 'RGBA'):
+        rendition = rendition.convert(
+            'RGBA' if 'A' in rendition.getbands() else 'RGB')
+    buffer = BytesIO()
+    rendition.save(buffer, 'WEBP',
+                   quality=settings.RECIPE_IMAGE_WEBP_QUALITY)
+    return ContentFile(buffer.getvalue())
+
+
+def create_renditions(recipe_id):
+    """Сохраняет уменьшенные копии изображения рецепта.
+
+    Поля обновляются, только если изображение не заменили за время
+    обработки. Возвращает True, если копии сохранены.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only('id', 'image').first()
+    if recipe is None or not recipe.image:
+        return False
+    name = os.path.splitext(os.path.basename(recipe.image.name))[0]
+    updates = {}
+    try:
+        with recipe.image.open('rb') as file, Image.open(file) as image:
+            image = ImageOps.exif_transpose(image)
+            for rendition, size in settings.RECIPE_IMAGE_RENDITIONS.items():
+                field_name = RENDITION_FIELDS[rendition]
+                field = Recipe._meta.get_field(field_name)
+                filename = field.generate_filename(
+                    recipe, f'{name}_{rendition}.webp')
+                updates[field_name] = field.storage.save(
+                    filename, make_rendition(image, size))
+    except (OSError, UnidentifiedImageError):
+        logger.exception('Не удалось обработать изображение рецепта %s',
+                         recipe_id)
+        return False
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=recipe.image.name).update(**updates)
+    if updated:
+        bump_version(f'recipe:{recipe_id}')
+        bump_version('recipes')
+    else:
+        delete_renditions(updates)
+    return bool(updated)
+
+
+def get_renditions(recipe):
+    """Имена файлов копий рецепта по полям"""
+    return {field_name: getattr(recipe, field_name).name
+            for field_name in RENDITION_FIELDS.values()}
+
+
+def delete_renditions(names):
+    """Удаляет файлы копий после коммита транзакции"""
+    def delete():
+        for field_name, name in names.items():
+            if name:
+                Recipe._meta.get_field(field_name).storage.delete(name)
+
+    transaction.on_commit(delete)
+
+
+def run_in_worker(recipe_id):
+    close_old_connections()
+    try:
+        create_renditions(recipe_id)
+    except Exception:
+        logger.exception('Ошибка обработки изображения рецепта %s',
+                         recipe_id)
+    finally:
+        connections.close_all()
+
+
+def submit(recipe_id):
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.RECIPE_IMAGE_WORKERS,
+            thread_name_prefix='recipe-images')
+    _executor.submit(run_in_worker, recipe_id)
+
+
+def schedule_renditions(recipe_id):
+    """Ставит обработку изображения в пул после коммита транзакции.
+
+    При RECIPE_IMAGE_WORKERS = 0 копии создаются сразу в текущем потоке.
+    """
+    if settings.RECIPE_IMAGE_WORKERS:
+        transaction.on_commit(lambda: submit(recipe_id))
+    else:
+        transaction.on_commit(lambda: create_renditions(recipe_id))
+
+
+def wait_for_renditions():
+    """Дожидается обработки всех поставленных в пул изображений"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
@@ -0,0 +1,479 @@
+import base64
+import json
+import math
+import random
+import tempfile
+import time
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from recipes.counters import recount_counters
+from recipes.images import wait_for_renditions
+from recipes.models import (Ingredient, Recipe, RecipeIngredients,
+                            RecipeScore, Tag)
+from rest_framework.authtoken.models import Token
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+from users.models import Following, User
+
+PASSWORD = 'Bench-Pass-2024!'
+
+# Рецепт с ингредиентами и тегами: объект запроса или ответ
+RECIPE_QUERIES = 3
+
+# Максимальное число запросов к базе для каждого эндпоинта. Запросы
+# записи каждый раз проходят все ветки изменения, поэтому пороги - это
+# худший случай, который не зависит от размера и случайности данных и
+# ловит вернувшиеся N+1. Пороги записи собраны из частей: изменение
+# части меняет свое слагаемое.
+QUERY_LIMITS = {
+    'auth-token-login': 5,
+    'auth-token-logout': 4,
+    'users-list': 4,
+    'users-create': 4,
+    'users-detail': 2,
+    'users-me': 1,
+    'users-set-password': 2,
+    'users-subscriptions': 4,
+    # автор и его проверка, BEGIN, подписка, счетчик, рецепты автора
+    'users-subscribe': 1 + 2 + 1 + 1 + 1 + 1 + 1,
+    # автор, BEGIN, выборка и удаление подписки для сигналов, счетчик
+    'users-unsubscribe': 1 + 1 + 2 + 1,
+    'tags-list': 1,
+    'tags-detail': 1,
+    'ingredients-list': 1,
+    'ingredients-detail': 1,
+    'ingredients-autocomplete': 1,
+    'recipes-list': 6,
+    'recipes-list-anonymous': 5,
+    'recipes-list-tags': 6,
+    'recipes-list-favorited': 6,
+    'recipes-list-shopping-cart': 6,
+    'recipes-list-author': 6,
+    'recipes-list-page-2': 6,
+    'recipes-list-popular': 6,
+    'recipes-detail': 4,
+    # BEGIN, рецепт, счетчик автора, строка оценки, ингредиенты: чтение
+    # и вставка, теги: чтение, проверка и вставка, ответ
+    'recipes-create': 1 + 1 + 1 + 1 + 2 + 3 + RECIPE_QUERIES,
+    # рецепт, BEGIN и изменение, ингредиенты: выборка и удаление для
+    # сигналов, изменение и вставка, теги: чтение, удаление, проверка и
+    # вставка, ответ
+    'recipes-update': RECIPE_QUERIES + 2 + 4 + 4 + RECIPE_QUERIES,
+    'recipes-delete': 11,
+    'recipes-favorite': 7,
+    'recipes-unfavorite': 4,
+    'recipes-shopping-cart': 7,
+    'recipes-shopping-cart-remove': 4,
+    'recipes-download-shopping-cart': 1,
+    'recipes-download-shopping-cart-json': 1,
+    'health': 1,
+    'metrics': 0,
+}
+
+# Множества избранного, списка покупок и подписок загружаются из базы
+# в каждом запросе без общего кеша и после каждого их изменения с ним
+MEMBERSHIP_QUERIES = {
+    'users-detail': 1,
+    'users-me': 1,
+    'users-subscribe': 1,
+    'recipes-list': 3,
+    'recipes-list-tags': 3,
+    'recipes-list-favorited': 3,
+    'recipes-list-shopping-cart': 3,
+    'recipes-list-author': 3,
+    'recipes-list-page-2': 3,
+    'recipes-list-popular': 3,
+    'recipes-detail': 3,
+    'recipes-create': 3,
+    'recipes-update': 3,
+}
+
+
+class Endpoint:
+    """Запрос к API, который замеряется несколько раз.
+
+    prepare вызывается перед каждым замером и может вернуть словарь,
+    заменяющий url и data, cleanup - после замера с полученным ответом.
+    Оба вызова в замер не входят.
+    """
+
+    def __init__(self, name, method, url, data=None, client='user',
+                 status=200, prepare=None, cleanup=None):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.data = data
+        self.client = client
+        self.status = status
+        self.prepare = prepare
+        self.cleanup = cleanup
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def make_image():
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), 'orange').save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+class Command(BaseCommand):
+    help = ('Замеряет число запросов к базе, задержку и размер ответа '
+            'всех эндпоинтов API на синтетических данных')
+
+    def add_arguments(self, parser):
+        self.add_seed_arguments(parser)
+        parser.add_argument('--repeat', type=int, default=10,
+                            help='Замеров каждого эндпоинта')
+        parser.add_argument('--output', help='Файл для JSON отчета')
+        parser.add_argument(
+            '--thresholds',
+            help='JSON с порогами вида {"recipes-list": {"queries": 12, '
+                 '"p95_ms": 50}}, дополняет встроенные пороги запросов')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Не удалять тестовую базу после замеров')
+
+    @staticmethod
+    def check_options(options):
+        """Данных должно хватать на все измеряемые запросы"""
+        if options['users'] < 4:
+            raise CommandError('Нужно минимум 4 пользователя')
+        if options['ingredients'] < 15 or options['tags'] < 3:
+            raise CommandError('Нужно минимум 15 ингредиентов и 3 тега')
+        if (options['users'] * options['recipes_per_user']
+                <= api_settings.PAGE_SIZE):
+            raise CommandError(
+                f'Для второй страницы ленты нужно больше '
+                f'{api_settings.PAGE_SIZE} рецептов')
+
+    def handle(self, *args, **options):
+        self.check_options(options)
+        thresholds = {name: {'queries': limit}
+                      for name, limit in QUERY_LIMITS.items()}
+        for name, queries in MEMBERSHIP_QUERIES.items():
+            thresholds[name]['queries'] += queries
+        if options['thresholds']:
+            with open(options['thresholds'], encoding='utf-8') as file:
+                for name, limits in json.load(file).items():
+                    thresholds.setdefault(name, {}).update(limits)
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(MEDIA_ROOT=media_root):
+                    self.seed(options)
+                    try:
+                        results = {
+                            endpoint.name: self.measure(endpoint, options)
+                            for endpoint in self.get_endpoints()}
+                    finally:
+                        wait_for_renditions()
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb'])
+        failures = self.check_thresholds(results, thresholds)
+        report = {
+            'scale': {key: options[key] for key in (
+                'users', 'recipes_per_user', 'ingredients',
+                'ingredients_per_recipe', 'tags', 'follows', 'cart_size',
+                'favorites', 'repeat', 'seed')},
+            'endpoints': results,
+            'failures': failures,
+        }
+        self.print_report(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Все пороги соблюдены'))
+
+    @staticmethod
+    def add_seed_arguments(parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes-per-user', type=int, default=10)
+        parser.add_argument('--ingredients', type=int, default=500)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=10)
+        parser.add_argument('--tags', type=int, default=6)
+        parser.add_argument('--follows', type=int, default=10,
+                            help='Подписок у каждого пользователя')
+        parser.add_argument('--cart-size', type=int, default=20)
+        parser.add_argument('--favorites', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def seed(self, options):
+        self.options = options
+        rnd = random.Random(options['seed'])
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            User(email=f'user{i}@bench.test', username=f'user{i}',
+                 first_name=f'Имя {i}', last_name=f'Фамилия {i}',
+                 password=password)
+            for i in range(options['users']))
+        users = list(User.objects.order_by('id'))
+        self.user, self.login_user, self.other = users[:3]
+        self.authors = users[3:]
+        self.token = Token.objects.create(user=self.user)
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {i}', color=f'#{i:06x}', slug=f'tag-{i}')
+            for i in range(options['tags']))
+        self.tags = list(Tag.objects.order_by('id'))
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+            for i in range(options['ingredients']))
+        self.ingredients = list(Ingredient.objects.order_by('id'))
+        Recipe.objects.bulk_create(
+            Recipe(author=author, name=f'Рецепт {author.id}-{i}',
+                   image='bench.png', text='Описание рецепта. ' * 20,
+                   cooking_time=rnd.randint(1, 120))
+            for author in users
+            for i in range(options['recipes_per_user']))
+        recipes = list(Recipe.objects.order_by('id'))
+        RecipeScore.objects.bulk_create(
+            RecipeScore(recipe=recipe) for recipe in recipes)
+        per_recipe = min(options['ingredients_per_recipe'],
+                         len(self.ingredients))
+        RecipeIngredients.objects.bulk_create(
+            RecipeIngredients(recipe=recipe, ingredient=ingredient,
+                              amount=rnd.randint(1, 500))
+            for recipe in recipes
+            for ingredient in rnd.sample(self.ingredients, per_recipe))
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe in recipes
+            for tag in rnd.sample(self.tags, min(2, len(self.tags))))
+        Following.objects.bulk_create(
+            Following(subscriber=user, author=author)
+            for user in users
+            for author in rnd.sample(
+                [author for author in self.authors if author != user],
+                min(options['follows'], len(self.authors) - 1)))
+        foreign = [recipe for recipe in recipes
+                   if recipe.author_id != self.user.id]
+        self.user.shopping_cart.add(
+            *rnd.sample(foreign, min(options['cart_size'], len(foreign))))
+        self.user.favorite_recipes.add(
+            *rnd.sample(foreign, min(options['favorites'], len(foreign))))
+        self.free_recipe = Recipe.objects.create(
+            author=self.other, name='Свободный рецепт', image='bench.png',
+            text='Описание', cooking_time=10)
+        self.free_recipe.tags.add(self.tags[0])
+        self.own_recipe = Recipe.objects.filter(author=self.user).first()
+        recount_counters()
+        self.clients = {'anonymous': APIClient(), 'user': APIClient()}
+        self.clients['user'].credentials(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.image = make_image()
+
+    def recipe_payload(self, name='Новый рецепт'):
+        return {
+            'ingredients': [{'id': ingredient.id, 'amount': 10}
+                            for ingredient in self.ingredients[:10]],
+            'tags': [tag.id for tag in self.tags[:2]],
+            'image': self.image,
+            'name': name,
+            'text': 'Описание рецепта',
+            'cooking_time': 15,
+        }
+
+    def login_client(self):
+        token, _ = Token.objects.get_or_create(user=self.login_user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return {'client': client}
+
+    @staticmethod
+    def new_user(number):
+        return {'data': {'email': f'new{number}@bench.test',
+                         'username': f'new{number}',
+                         'first_name': 'Имя', 'last_name': 'Фамилия',
+                         'password': PASSWORD}}
+
+    def reset_own_recipe(self):
+        """Состав рецепта, который меняет recipes-update.
+
+        Запрос удаляет, изменяет и добавляет по пять ингредиентов и
+        меняет теги, поэтому число запросов не зависит от данных.
+        """
+        recipe = self.own_recipe
+        RecipeIngredients.objects.filter(recipe=recipe).delete()
+        RecipeIngredients.objects.bulk_create(
+            RecipeIngredients(recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in self.ingredients[:10])
+        recipe.tags.set(self.tags[:2])
+
+    def update_payload(self):
+        return {
+            **self.recipe_payload('Измененный рецепт'),
+            'ingredients': [{'id': ingredient.id, 'amount': 10}
+                            for ingredient in self.ingredients[5:15]],
+            'tags': [tag.id for tag in self.tags[1:3]],
+        }
+
+    def create_recipe(self):
+        recipe = Recipe.objects.create(
+            author=self.user, name='Удаляемый рецепт', image='bench.png',
+            text='Описание', cooking_time=5)
+        return {'url': f'/api/recipes/{recipe.id}/'}
+
+    def get_endpoints(self):
+        user = self.user
+        recipe = self.free_recipe
+        author = self.other
+        counter = iter(range(self.options['repeat']))
+        return [
+            Endpoint('auth-token-login', 'post', '/api/auth/token/login/',
+                     {'email': self.login_user.email, 'password': PASSWORD},
+                     client='anonymous',
+                     cleanup=lambda response: Token.objects.filter(
+                         user=self.login_user).delete()),
+            Endpoint('auth-token-logout', 'post', '/api/auth/token/logout/',
+                     status=204, prepare=self.login_client),
+            Endpoint('users-list', 'get', '/api/users/'),
+            Endpoint('users-create', 'post', '/api/users/', status=201,
+                     client='anonymous',
+                     prepare=lambda: self.new_user(next(counter)),
+                     cleanup=lambda response: User.objects.filter(
+                         email__startswith='new').delete()),
+            Endpoint('users-detail', 'get', f'/api/users/{author.id}/'),
+            Endpoint('users-me', 'get', '/api/users/me/'),
+            Endpoint('users-set-password', 'post',
+                     '/api/users/set_password/',
+                     {'new_password': PASSWORD, 'current_password': PASSWORD},
+                     status=204),
+            Endpoint('users-subscriptions', 'get',
+                     '/api/users/subscriptions/?recipes_limit=3'),
+            Endpoint('users-subscribe', 'post',
+                     f'/api/users/{author.id}/subscribe/',
+                     cleanup=lambda response: Following.objects.filter(
+                         subscriber=user, author=author).delete()),
+            Endpoint('users-unsubscribe', 'delete',
+                     f'/api/users/{author.id}/subscribe/', status=204,
+                     prepare=lambda: user.following.add(author)),
+            Endpoint('tags-list', 'get', '/api/tags/', client='anonymous'),
+            Endpoint('tags-detail', 'get', f'/api/tags/{self.tags[0].id}/',
+                     client='anonymous'),
+            Endpoint('ingredients-list', 'get', '/api/ingredients/',
+                     client='anonymous'),
+            Endpoint('ingredients-detail', 'get',
+                     f'/api/ingredients/{self.ingredients[0].id}/',
+                     client='anonymous'),
+            Endpoint('ingredients-autocomplete', 'get',
+                     '/api/ingredients/?name=ингредиент 1',
+                     client='anonymous'),
+            Endpoint('recipes-list', 'get', '/api/recipes/'),
+            Endpoint('recipes-list-anonymous', 'get', '/api/recipes/',
+                     client='anonymous'),
+            Endpoint('recipes-list-tags', 'get',
+                     f'/api/recipes/?tags={self.tags[0].slug}'
+                     f'&tags={self.tags[1].slug}'),
+            Endpoint('recipes-list-favorited', 'get',
+                     '/api/recipes/?is_favorited=1'),
+            Endpoint('recipes-list-shopping-cart', 'get',
+                     '/api/recipes/?is_in_shopping_cart=1'),
+            Endpoint('recipes-list-author', 'get',
+                     f'/api/recipes/?author={author.id}'),
+            Endpoint('recipes-list-page-2', 'get', '/api/recipes/?page=2'),
+            Endpoint('recipes-list-popular', 'get',
+                     '/api/recipes/?ordering=popular'),
+            Endpoint('recipes-detail', 'get', f'/api/recipes/{recipe.id}/'),
+            Endpoint('recipes-create', 'post', '/api/recipes/',
+                     self.recipe_payload(), status=201,
+                     cleanup=lambda response: Recipe.objects.filter(
+                         id=response.data['id']).delete()),
+            Endpoint('recipes-update', 'put',
+                     f'/api/recipes/{self.own_recipe.id}/',
+                     self.update_payload(), status=201,
+                     prepare=self.reset_own_recipe),
+            Endpoint('recipes-delete', 'delete', None, status=204,
+                     prepare=self.create_recipe),
+            Endpoint('recipes-favorite', 'post',
+                     f'/api/recipes/{recipe.id}/favorite/',
+                     cleanup=lambda response: recipe.favorited_by.remove(
+                         user)),
+            Endpoint('recipes-unfavorite', 'delete',
+                     f'/api/recipes/{recipe.id}/favorite/', status=204,
+                     prepare=lambda: recipe.favorited_by.add(user)),
+            Endpoint('recipes-shopping-cart', 'post',
+                     f'/api/recipes/{recipe.id}/shopping_cart/',
+                     cleanup=lambda response: user.shopping_cart.remove(
+                         recipe)),
+            Endpoint('recipes-shopping-cart-remove', 'delete',
+                     f'/api/recipes/{recipe.id}/shopping_cart/', status=204,
+                     prepare=lambda: user.shopping_cart.add(recipe)),
+            Endpoint('recipes-download-shopping-cart', 'get',
+                     '/api/recipes/download_shopping_cart/'),
+            Endpoint('recipes-download-shopping-cart-json', 'get',
+                     '/api/recipes/download_shopping_cart/?format=json'),
+            Endpoint('health', 'get', '/api/health/', client='anonymous'),
+            Endpoint('metrics', 'get', '/api/metrics/', client='anonymous'),
+        ]
+
+    def measure(self, endpoint, options):
+        timings, queries, sizes = [], [], []
+        for _ in range(options['repeat']):
+            request = {'url': endpoint.url, 'data': endpoint.data,
+                       'client': self.clients[endpoint.client]}
+            if endpoint.prepare:
+                request.update(endpoint.prepare() or {})
+            method = getattr(request['client'], endpoint.method)
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = method(request['url'], request['data'],
+                                  format='json')
+                if response.streaming:
+                    size = sum(map(len, response.streaming_content))
+                else:
+                    size = len(response.content)
+                elapsed = time.perf_counter() - started
+            if response.status_code != endpoint.status:
+                raise CommandError(
+                    f'{endpoint.name}: ожидался статус {endpoint.status}, '
+                    f'получен {response.status_code}')
+            if endpoint.cleanup:
+                endpoint.cleanup(response)
+            timings.append(elapsed * 1000)
+            queries.append(len(context))
+            sizes.append(size)
+        return {
+            'method': endpoint.method.upper(),
+            'url': request['url'],
+            'status': endpoint.status,
+            'queries': max(queries),
+            'p50_ms': round(percentile(timings, 0.5), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'bytes': max(sizes),
+        }
+
+    @staticmethod
+    def check_thresholds(results, thresholds):
+        failures = []
+        for name, limits in thresholds.items():
+            result = results.get(name)
+            if result is None:
+                continue
+            for metric, limit in limits.items():
+                if result[metric] > limit:
+                    failures.append(
+                        f'{name}: {metric} = {result[metric]}, '
+                        f'порог {limit}')
+        return failures
+
+    def print_report(self, results):
+        self.stdout.write(
+            f'{"эндпоинт":<38}{"запросы":>8}{"p50, мс":>10}'
+            f'{"p95, мс":>10}{"байт":>10}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<38}{result["queries"]:>8}{result["p50_ms"]:>10.2f}'
+                f'{result["p95_ms"]:>10.2f}{result["bytes"]:>10}')
@@ -0,0 +1,170 @@
+import time
+
+from api.serializers import (RecipeReadSerializer, RecipeShortSerializer,
+                             SubscriptionSerializer)
+from api.values_serializers import (RecipeShortValuesSerializer,
+                                    RecipeValuesSerializer,
+                                    SubscriptionValuesSerializer)
+from api.views import RecipeViewSet
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Prefetch, Value
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Recipe
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.test import APIRequestFactory
+
+from .benchmark_api import Command as BenchmarkCommand
+from .benchmark_api import percentile
+
+
+class Case:
+    """Одни и те же данные через сериализатор DRF и из строк .values().
+
+    Функции получают свежий запрос и возвращают данные ответа, запросы
+    к базе входят в замер.
+    """
+
+    def __init__(self, name, drf, values):
+        self.name = name
+        self.drf = drf
+        self.values = values
+
+
+class Command(BenchmarkCommand):
+    help = ('Сравнивает сериализаторы DRF и сериализаторы из строк '
+            '.values() на синтетических данных и проверяет, что JSON '
+            'ответов совпадает побайтно')
+
+    def add_arguments(self, parser):
+        self.add_seed_arguments(parser)
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Замеров каждого сериализатора')
+        parser.add_argument('--page-size', type=int,
+                            default=api_settings.PAGE_SIZE)
+
+    def handle(self, *args, **options):
+        if options['users'] < 4:
+            raise CommandError('Нужно минимум 4 пользователя')
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.seed(options)
+            # Половина рецептов с готовыми копиями изображений
+            ids = Recipe.objects.order_by('id').values_list('id', flat=True)
+            Recipe.objects.filter(id__in=list(ids)[::2]).update(
+                image_thumbnail='recipes/bench_thumbnail.webp',
+                image_medium='recipes/bench_medium.webp')
+            self.factory = APIRequestFactory()
+            results = [self.measure(case, options)
+                       for case in self.get_cases(options)]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        self.print_report(results)
+        different = [result['name'] for result in results
+                     if not result['identical']]
+        if different:
+            raise CommandError(
+                f'JSON отличается: {", ".join(different)}')
+        self.stdout.write(self.style.SUCCESS('JSON совпадает'))
+
+    def get_request(self):
+        request = self.factory.get('/api/recipes/')
+        request.user = self.user
+        return request
+
+    def get_cases(self, options):
+        size = options['page_size']
+        recipes = RecipeViewSet.queryset
+        recipe_id = self.free_recipe.id
+        following = (self.user.following.
+                     annotate(is_subscribed=Value(True)).
+                     order_by('-date_joined'))
+        recipes_limit = 3
+        limited_recipes = Prefetch(
+            'recipes', to_attr='limited_recipes',
+            queryset=SubscriptionValuesSerializer.get_recipes_queryset(
+                recipes_limit))
+        list_context = {'image_rendition': 'medium'}
+        subscriptions_context = {'recipes_limit': recipes_limit}
+        return [
+            Case('recipes-list',
+                 lambda request: RecipeReadSerializer(
+                     recipes[:size], many=True,
+                     context={'request': request, **list_context}).data,
+                 lambda request: RecipeValuesSerializer(
+                     RecipeValuesSerializer.get_queryset(recipes)[:size],
+                     many=True,
+                     context={'request': request, **list_context}).data),
+            Case('recipes-detail',
+                 lambda request: RecipeReadSerializer(
+                     recipes.get(pk=recipe_id),
+                     context={'request': request}).data,
+                 lambda request: RecipeValuesSerializer(
+                     RecipeValuesSerializer.get_queryset(recipes).
+                     get(pk=recipe_id),
+                     context={'request': request}).data),
+            Case('recipes-short',
+                 lambda request: RecipeShortSerializer(
+                     Recipe.objects.all()[:size], many=True).data,
+                 lambda request: RecipeShortValuesSerializer(
+                     RecipeShortValuesSerializer.get_queryset(
+                         Recipe.objects.all())[:size],
+                     many=True).data),
+            Case('users-subscriptions',
+                 lambda request: SubscriptionSerializer(
+                     following.prefetch_related(limited_recipes)[:size],
+                     many=True,
+                     context={'request': request,
+                              **subscriptions_context}).data,
+                 lambda request: SubscriptionValuesSerializer(
+                     SubscriptionValuesSerializer.get_queryset(
+                         following)[:size],
+                     many=True,
+                     context={'request': request,
+                              **subscriptions_context}).data),
+        ]
+
+    def run(self, serialize, options):
+        renderer = JSONRenderer()
+        # Первый вызов заполняет кеши множеств пользователя
+        serialize(self.get_request())
+        timings, queries = [], []
+        for _ in range(options['repeat']):
+            request = self.get_request()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                data = serialize(request)
+                elapsed = time.perf_counter() - started
+            timings.append(elapsed * 1000)
+            queries.append(len(context))
+        return renderer.render(data), timings, max(queries)
+
+    def measure(self, case, options):
+        drf_content, drf_timings, drf_queries = self.run(case.drf, options)
+        values_content, values_timings, values_queries = self.run(
+            case.values, options)
+        drf_ms = percentile(drf_timings, 0.5)
+        values_ms = percentile(values_timings, 0.5)
+        return {
+            'name': case.name,
+            'drf_ms': round(drf_ms, 3),
+            'values_ms': round(values_ms, 3),
+            'speedup': round(drf_ms / values_ms, 2),
+            'drf_queries': drf_queries,
+            'values_queries': values_queries,
+            'identical': drf_content == values_content,
+        }
+
+    def print_report(self, results):
+        self.stdout.write(
+            f'{"сериализатор":<22}{"DRF, мс":>10}{"values, мс":>12}'
+            f'{"ускорение":>11}{"запросы":>10}{"JSON":>8}')
+        for result in results:
+            queries = f'{result["drf_queries"]}/{result["values_queries"]}'
+            identical = 'равен' if result['identical'] else 'ОТЛИЧ'
+            self.stdout.write(
+                f'{result["name"]:<22}{result["drf_ms"]:>10.2f}'
+                f'{result["values_ms"]:>12.2f}{result["speedup"]:>11.2f}'
+                f'{queries:>10}{identical:>8}')
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from recipes.images import create_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Создает уменьшенные копии изображений рецептов в формате WebP '
+            'для рецептов, у которых их еще нет')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать копии у всех рецептов')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_medium='')
+        created = sum(
+            create_renditions(pk) for pk in
+            recipes.values_list('pk', flat=True).iterator())
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {created}, '
+            f'время {time.perf_counter() - started:.3f} с'))
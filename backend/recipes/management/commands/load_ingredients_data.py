@@ -1,24 +1,118 @@
 import csv
-from django.core.management.base import BaseCommand
+import io
+import json
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.cache import bump_version
 from recipes.models import Ingredient
 
 
 class Command(BaseCommand):
-    help = 'Загружает в базу ингредиенты из CSV файла'
+    help = 'Загружает в базу ингредиенты из CSV или JSON файла'
 
     def add_arguments(self, parser):
         parser.add_argument(
             'path', default='./data/ingredients.csv', nargs='?',
             help='Путь до файла с данными относительно manage.py')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном запросе к базе')
+        parser.add_argument(
+            '--update', action='store_true',
+            help='Обновлять единицы измерения у существующих ингредиентов')
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Загружать через COPY во временную таблицу (PostgreSQL)')
+
+    @staticmethod
+    def read_csv(file):
+        for row in csv.reader(file):
+            if row:
+                yield row[0], row[1]
+
+    @staticmethod
+    def read_json(file):
+        for item in json.load(file):
+            yield item['name'], item['measurement_unit']
+
+    def read_ingredients(self, path):
+        """Читает файл и убирает повторы, последняя строка побеждает"""
+        reader = self.read_json if path.endswith('.json') else self.read_csv
+        ingredients = {}
+        rows = 0
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                for name, measurement_unit in reader(file):
+                    rows += 1
+                    name = name.strip()
+                    if name:
+                        ingredients[name] = measurement_unit.strip()
+        except (OSError, ValueError, KeyError, IndexError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        return rows, ingredients
+
+    @staticmethod
+    def chunks(items, size):
+        iterator = iter(items)
+        while True:
+            chunk = list(islice(iterator, size))
+            if not chunk:
+                return
+            yield chunk
+
+    def bulk_load(self, ingredients, batch_size, update):
+        options = {'ignore_conflicts': True}
+        if update:
+            options = {'update_conflicts': True,
+                       'unique_fields': ('name',),
+                       'update_fields': ('measurement_unit',)}
+        for chunk in self.chunks(ingredients.items(), batch_size):
+            Ingredient.objects.bulk_create(
+                [Ingredient(name=name, measurement_unit=measurement_unit)
+                 for name, measurement_unit in chunk],
+                **options)
+
+    @staticmethod
+    def copy_load(ingredients, update):
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(ingredients.items())
+        buffer.seek(0)
+        on_conflict = (
+            'DO UPDATE SET measurement_unit = EXCLUDED.measurement_unit'
+            if update else 'DO NOTHING')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredients_staging '
+                '(name varchar(50), measurement_unit varchar(10)) '
+                'ON COMMIT DROP')
+            cursor.cursor.copy_expert(
+                'COPY ingredients_staging FROM STDIN WITH (FORMAT csv)',
+                buffer)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT name, measurement_unit FROM ingredients_staging '
+                f'ON CONFLICT (name) {on_conflict}')
 
     def handle(self, *args, **options):
-        print(options['path'])
-        with open(options['path'], 'r') as file:
-            reader = csv.reader(file)
-            count = 1
-            for row in reader:
-                ingredient, created = Ingredient.objects.get_or_create(
-                    name=row[0],
-                    measurement_unit=row[1]
-                )
-                print(f'Row: {count} Ingredient: {row[0]} Created: {created}')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy доступен только для PostgreSQL')
+        started = time.perf_counter()
+        rows, ingredients = self.read_ingredients(options['path'])
+        count_before = Ingredient.objects.count()
+        with transaction.atomic():
+            if options['copy']:
+                self.copy_load(ingredients, options['update'])
+            else:
+                self.bulk_load(
+                    ingredients, options['batch_size'], options['update'])
+        bump_version('ingredients')
+        created = Ingredient.objects.count() - count_before
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{options["path"]}: строк {rows}, уникальных {len(ingredients)}, '
+            f'добавлено {created}, уже было {len(ingredients) - created}, '
+            f'время {elapsed:.3f} с'))
@@ -0,0 +1,92 @@
+import threading
+import time
+from itertools import cycle
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from .benchmark_api import percentile
+
+DEFAULT_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?page=2',
+    '/api/tags/',
+    '/api/ingredients/?name=мол',
+)
+
+
+class Command(BaseCommand):
+    help = ('Нагружает запущенный сервер параллельными GET запросами и '
+            'выводит пропускную способность, задержку и число ошибок')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000',
+                            help='Адрес сервера')
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Путь для запросов, можно указать несколько раз')
+        parser.add_argument('--token', help='Токен пользователя')
+        parser.add_argument('--concurrency', type=int, default=20,
+                            help='Число одновременных клиентов')
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Длительность нагрузки в секундах')
+        parser.add_argument('--timeout', type=float, default=10)
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency должен быть больше нуля')
+        session_headers = {'Accept': 'application/json'}
+        if options['token']:
+            session_headers['Authorization'] = f'Token {options["token"]}'
+        urls = [options['url'].rstrip('/') + path
+                for path in options['paths'] or DEFAULT_PATHS]
+        self.latencies = []
+        self.errors = []
+        self.lock = threading.Lock()
+        deadline = time.perf_counter() + options['duration']
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=self.run_client, args=(
+                urls[number % len(urls):] + urls[:number % len(urls)],
+                session_headers, deadline, options['timeout']))
+            for number in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.print_report(time.perf_counter() - started)
+
+    def run_client(self, urls, session_headers, deadline, timeout):
+        """Запросы по кругу от одного клиента до истечения времени"""
+        with requests.Session() as session:
+            session.headers.update(session_headers)
+            for url in cycle(urls):
+                started = time.perf_counter()
+                if started >= deadline:
+                    break
+                try:
+                    response = session.get(url, timeout=timeout)
+                    error = (None if response.ok
+                             else f'{response.status_code} {url}')
+                except requests.RequestException as exc:
+                    error = f'{type(exc).__name__} {url}'
+                elapsed = time.perf_counter() - started
+                with self.lock:
+                    if error:
+                        self.errors.append(error)
+                    else:
+                        self.latencies.append(elapsed)
+
+    def print_report(self, elapsed):
+        latencies, errors = self.latencies, self.errors
+        total = len(latencies) + len(errors)
+        self.stdout.write(
+            f'запросов: {total}, ошибок: {len(errors)}, '
+            f'RPS: {total / elapsed:.1f}')
+        if latencies:
+            self.stdout.write(
+                f'p50: {percentile(latencies, 0.5) * 1000:.1f} мс, '
+                f'p95: {percentile(latencies, 0.95) * 1000:.1f} мс, '
+                f'p99: {percentile(latencies, 0.99) * 1000:.1f} мс')
+        for error in sorted(set(errors))[:10]:
+            self.stdout.write(self.style.ERROR(error))
@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+from recipes.counters import recount_counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики избранного, списков покупок, '
+            'рецептов и подписчиков')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        recount_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Счетчики пересчитаны за {time.perf_counter() - started:.3f} с'))
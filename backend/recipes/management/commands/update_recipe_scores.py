@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from recipes.scores import update_recipe_scores
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает оценки для сортировки рецептов по популярности. '
+            'Рассчитан на периодический запуск, например из cron')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать все рецепты, а не только изменившиеся')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        updated = update_recipe_scores(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено оценок: {updated}, '
+            f'время {time.perf_counter() - started:.3f} с'))
@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from users.models import Following
+
+from recipes.counters import FavoriteRecipe, ShoppingCartRecipe
+from recipes.metrics import cache_lookup
+
+
+class Membership:
+    """Множество id объектов, связанных с пользователем.
+
+    Загружается один раз за запрос. С общим кешем (CACHE_SHARED)
+    множество хранится в нем между запросами и удаляется после коммита
+    действиями API и сигналами изменений в обход API, а не изменяется
+    на месте: одновременные изменения затерли бы друг друга.
+    Кеш процесса не видит изменений из других воркеров, поэтому без
+    общего кеша множество загружается из базы в каждом запросе.
+    """
+
+    def __init__(self, name, through, user_field, object_field):
+        self.name = name
+        self.through = through
+        self.user_field = user_field
+        self.object_field = object_field
+        self.request_attr = f'_membership_{name}'
+
+    def get_key(self, user_id):
+        return f'membership:{self.name}:{user_id}'
+
+    def get_queryset(self, user_id):
+        return (self.through.objects.
+                filter(**{self.user_field: user_id}).
+                values_list(self.object_field, flat=True))
+
+    def get(self, request):
+        """Множество для пользователя запроса, у анонима оно пустое"""
+        user = request.user
+        if not user.is_authenticated:
+            return frozenset()
+        ids = getattr(request, self.request_attr, None)
+        if ids is None:
+            key = self.get_key(user.id)
+            if settings.CACHE_SHARED:
+                ids = cache_lookup('membership', cache.get(key))
+            if ids is None:
+                ids = set(self.get_queryset(user.id))
+                self._set(key, ids)
+            setattr(request, self.request_attr, ids)
+        return ids
+
+    async def aload(self, request):
+        """Загружает множество в запрос асинхронным ORM.
+
+        После этого get() в сериализаторах не обращается к базе.
+        """
+        user = request.user
+        if not user.is_authenticated or hasattr(request, self.request_attr):
+            return
+        key = self.get_key(user.id)
+        ids = None
+        if settings.CACHE_SHARED:
+            ids = cache_lookup('membership', await cache.aget(key))
+        if ids is None:
+            ids = {pk async for pk in self.get_queryset(user.id)}
+            if settings.CACHE_SHARED:
+                await cache.aset(key, ids, settings.MEMBERSHIP_CACHE_TIMEOUT)
+        setattr(request, self.request_attr, ids)
+
+    @staticmethod
+    def _set(key, ids):
+        if settings.CACHE_SHARED:
+            cache.set(key, ids, settings.MEMBERSHIP_CACHE_TIMEOUT)
+
+    def invalidate(self, user_ids):
+        if not settings.CACHE_SHARED:
+            return
+        keys = [self.get_key(user_id) for user_id in user_ids]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+favorites = Membership('favorites', FavoriteRecipe, 'user_id', 'recipe_id')
+shopping_cart = Membership(
+    'shopping_cart', ShoppingCartRecipe, 'user_id', 'recipe_id')
+following = Membership('following', Following, 'subscriber_id', 'author_id')
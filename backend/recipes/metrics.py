@@ -0,0 +1,37 @@
+"""Метрики Prometheus.
+
+Если задана переменная PROMETHEUS_MULTIPROC_DIR, значения пишутся в
+отображаемые в память файлы этого каталога и при выдаче суммируются по
+всем процессам gunicorn.
+"""
+from prometheus_client import Counter, Gauge, Histogram
+
+REQUESTS = Counter(
+    'http_requests_total', 'Запросы к серверу',
+    ('route', 'method', 'status'))
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Время обработки запроса',
+    ('route', 'method'))
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'Число запросов к базе за запрос к серверу',
+    ('route',), buckets=(0, 1, 2, 4, 8, 16, 32, 64))
+REQUESTS_IN_PROGRESS = Gauge(
+    'http_requests_in_progress', 'Запросы, которые обрабатываются сейчас',
+    multiprocess_mode='livesum')
+WORKERS = Gauge(
+    'worker_processes', 'Работающие процессы сервера',
+    multiprocess_mode='livesum')
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Обращения к кешам приложения',
+    ('cache', 'result'))
+SHOPPING_CART_EXPORT_BYTES = Histogram(
+    'shopping_cart_export_bytes', 'Размер выгруженного списка покупок',
+    ('format',), buckets=tuple(1024 * 4 ** power for power in range(6)))
+
+WORKERS.set(1)
+
+
+def cache_lookup(name, value):
+    """Учитывает попадание или промах кеша name и возвращает value"""
+    CACHE_REQUESTS.labels(name, 'miss' if value is None else 'hit').inc()
+    return value
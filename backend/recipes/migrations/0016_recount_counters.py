@@ -0,0 +1,37 @@
+# Generated by Django 4.1 on 2026-10-18 21:30
+
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).
+        order_by().values(field).annotate(count=Count('*')).
+        values('count')), 0)
+
+
+def recount_counters(apps, schema_editor):
+    """Счетчики, пропущенные записями в обход API до перехода на сигналы"""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    User = apps.get_model('users', 'User')
+    Recipe.objects.update(
+        favorites_count=count_subquery(Recipe.favorited_by.through, 'recipe'),
+        in_carts_count=count_subquery(User.shopping_cart.through, 'recipe'))
+    User.objects.update(
+        recipes_count=count_subquery(Recipe, 'author'),
+        followers_count=count_subquery(
+            apps.get_model('users', 'Following'), 'author'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipe_image_renditions'),
+        ('users', '0012_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(recount_counters, migrations.RunPython.noop),
+    ]
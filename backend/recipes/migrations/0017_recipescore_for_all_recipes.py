@@ -0,0 +1,39 @@
+# Generated by Django 4.1 on 2026-10-18 21:22
+
+from django.db import migrations, models
+
+
+def create_missing_scores(apps, schema_editor):
+    """Лента по популярности соединяет рецепты с оценками без LEFT JOIN"""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeScore = apps.get_model('recipes', 'RecipeScore')
+    RecipeScore.objects.bulk_create(
+        (RecipeScore(recipe_id=pk) for pk in Recipe.objects.filter(
+            score__isnull=True).values_list('pk', flat=True)),
+        batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_recount_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_scores, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='recipescore',
+            name='recipe_score_popularity_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipescore',
+            name='recipe_score_trending_idx',
+        ),
+        migrations.AddIndex(
+            model_name='recipescore',
+            index=models.Index(fields=['-popularity', '-recipe'], name='recipe_score_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipescore',
+            index=models.Index(fields=['-trending', '-recipe'], name='recipe_score_trending_idx'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from django.db import models
+from users.models import CountersMixin
 
 User = get_user_model()
 
@@ -30,7 +31,7 @@ class Ingredient(models.Model):
         return f'{self.name} {self.measurement_unit}.'
 
 
-class Recipe(models.Model):
+class Recipe(CountersMixin, models.Model):
     tags = models.ManyToManyField(
         Tag,
         verbose_name='Теги',
@@ -57,22 +58,49 @@ class Recipe(models.Model):
         blank=True)
     name = models.CharField('Название', max_length=50)
     image = models.ImageField('Изображение', upload_to='%Y/%m/%d/')
+    image_thumbnail = models.ImageField(
+        'Миниатюра', upload_to='renditions/%Y/%m/%d/', blank=True,
+        editable=False)
+    image_medium = models.ImageField(
+        'Среднее изображение', upload_to='renditions/%Y/%m/%d/', blank=True,
+        editable=False)
     text = models.TextField('Описание')
     cooking_time = models.SmallIntegerField(
         'Время приготовления в минутах',
         validators=[MinValueValidator(1, 'Минимальное значение 1 минута')]
     )
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное', default=0, editable=False)
+    in_carts_count = models.PositiveIntegerField(
+        'Добавлений в список покупок', default=0, editable=False)
+
+    counter_fields = ('favorites_count', 'in_carts_count')
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class RecipeIngredientsQuerySet(models.QuerySet):
+    def shopping_cart_totals(self, user):
+        """Суммарное количество ингредиентов из списка покупок"""
+        cart_recipes = Recipe.shopping_cart.through.objects.filter(
+            user_id=user.id).values('recipe_id')
+        return (self.filter(recipe_id__in=cart_recipes).
+                values('ingredient__name', 'ingredient__measurement_unit').
+                annotate(total=models.Sum('amount')).
+                order_by('ingredient__name', 'ingredient__measurement_unit'))
+
+
 class RecipeIngredients(models.Model):
     recipe = models.ForeignKey(
         Recipe, verbose_name='Рецепт', on_delete=models.CASCADE)
@@ -80,6 +108,8 @@ class RecipeIngredients(models.Model):
         Ingredient, verbose_name='Ингредиент', on_delete=models.CASCADE)
     amount = models.SmallIntegerField('Количество')
 
+    objects = RecipeIngredientsQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Ингредиенты в рецепте'
         verbose_name_plural = 'Ингредиенты в рецепте'
@@ -88,3 +118,32 @@ class RecipeIngredients(models.Model):
                 fields=['recipe', 'ingredient'],
                 name='unique_ingredients_in_recipe'),
         ]
+
+
+class RecipeScore(models.Model):
+    """Предрасчитанные оценки популярности рецепта для сортировки ленты"""
+    recipe = models.OneToOneField(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score'
+    )
+    favorites_count = models.PositiveIntegerField(
+        'Учтено добавлений в избранное', default=0)
+    in_carts_count = models.PositiveIntegerField(
+        'Учтено добавлений в список покупок', default=0)
+    popularity = models.FloatField('Популярность', default=0)
+    trending = models.FloatField('Популярность за последнее время',
+                                 default=0)
+    updated_at = models.DateTimeField('Дата пересчета', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Оценка рецепта'
+        verbose_name_plural = 'Оценки рецептов'
+        indexes = [
+            models.Index(fields=['-popularity', '-recipe'],
+                         name='recipe_score_popularity_idx'),
+            models.Index(fields=['-trending', '-recipe'],
+                         name='recipe_score_trending_idx'),
+        ]
@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from recipes.cache import bump_version
+from recipes.models import Recipe, RecipeScore
+
+
+def get_popularity(favorites_count, in_carts_count):
+    return (favorites_count * settings.RECIPE_SCORE_FAVORITE_WEIGHT
+            + in_carts_count * settings.RECIPE_SCORE_CART_WEIGHT)
+
+
+def get_trending(popularity, pub_date, now):
+    """Популярность, затухающая с возрастом рецепта"""
+    age_hours = max((now - pub_date).total_seconds(), 0) / 3600
+    return popularity / (age_hours + 2) ** settings.RECIPE_TRENDING_GRAVITY
+
+
+def update_recipe_scores(full=False, now=None):
+    """Пересчитывает оценки рецептов и возвращает число измененных строк.
+
+    Без full пересчитываются только рецепты, у которых изменились
+    счетчики, и рецепты из окна RECIPE_TRENDING_WINDOW_DAYS, чья оценка
+    trending затухает со временем.
+    """
+    now = now or timezone.now()
+    window_start = now - timedelta(days=settings.RECIPE_TRENDING_WINDOW_DAYS)
+    RecipeScore.objects.bulk_create(
+        (RecipeScore(recipe_id=pk) for pk in Recipe.objects.filter(
+            score__isnull=True).values_list('pk', flat=True)),
+        ignore_conflicts=True)
+    scores = RecipeScore.objects.select_related('recipe').only(
+        'recipe__favorites_count', 'recipe__in_carts_count',
+        'recipe__pub_date', 'favorites_count', 'in_carts_count',
+        'popularity', 'trending')
+    if not full:
+        scores = scores.filter(
+            ~Q(favorites_count=F('recipe__favorites_count'))
+            | ~Q(in_carts_count=F('recipe__in_carts_count'))
+            | Q(recipe__pub_date__gte=window_start)
+            | Q(trending__gt=0, recipe__pub_date__lt=window_start))
+    changed = []
+    for score in scores.iterator(chunk_size=2000):
+        recipe = score.recipe
+        score.favorites_count = recipe.favorites_count
+        score.in_carts_count = recipe.in_carts_count
+        score.popularity = get_popularity(
+            recipe.favorites_count, recipe.in_carts_count)
+        score.trending = 0
+        if recipe.pub_date >= window_start:
+            score.trending = get_trending(
+                score.popularity, recipe.pub_date, now)
+        score.updated_at = now
+        changed.append(score)
+    RecipeScore.objects.bulk_update(
+        changed, ('favorites_count', 'in_carts_count', 'popularity',
+                  'trending', 'updated_at'), batch_size=1000)
+    if changed:
+        bump_version('recipe_scores')
+    return len(changed)
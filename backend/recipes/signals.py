@@ -0,0 +1,118 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from recipes import membership
+from recipes.cache import bump_version
+from recipes.counters import COUNTERS, FavoriteRecipe, ShoppingCartRecipe
+from recipes.models import (Ingredient, Recipe, RecipeIngredients,
+                            RecipeScore, Tag)
+
+User = get_user_model()
+
+PROFILE_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+for counter in COUNTERS:
+    counter.connect()
+
+
+def bump_recipe_versions(recipe_id):
+    bump_version(f'recipe:{recipe_id}')
+    bump_version('recipes')
+
+
+def bump_user_versions(user_id):
+    bump_version(f'user:{user_id}')
+    bump_version('recipes')
+
+
+def recipe_changed(recipe_id):
+    """Версии меняются после коммита, когда записаны ингредиенты и теги"""
+    transaction.on_commit(lambda: bump_recipe_versions(recipe_id))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(**kwargs):
+    bump_version('ingredients')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(**kwargs):
+    bump_version('tags')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_saved(instance, **kwargs):
+    recipe_changed(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(instance, created, **kwargs):
+    """Оценка есть у каждого рецепта, с ней его соединяет лента"""
+    if created:
+        RecipeScore.objects.bulk_create(
+            (RecipeScore(recipe=instance),), ignore_conflicts=True)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredients)
+def recipe_ingredient_changed(instance, origin=None, **kwargs):
+    """Ингредиенты, измененные без сохранения рецепта.
+
+    Так их меняют инлайны админки и ORM, а API удаляет убранные из
+    рецепта ингредиенты. Удаление самого рецепта меняет версии в
+    recipe_saved.
+    """
+    if isinstance(origin, Recipe):
+        return
+    recipe_changed(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, reverse, pk_set, **kwargs):
+    """Теги рецептов, измененные без сохранения рецепта"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        recipe_ids = (instance.pk,)
+    elif action == 'pre_clear':
+        recipe_ids = list(instance.recipes.values_list('id', flat=True))
+    else:
+        recipe_ids = pk_set
+    for recipe_id in recipe_ids:
+        recipe_changed(recipe_id)
+
+
+@receiver(post_save, sender=User)
+def user_saved(instance, created, update_fields, **kwargs):
+    """Профиль автора выводится в рецептах, last_login и пароль - нет"""
+    if created or (update_fields is not None
+                   and not PROFILE_FIELDS & set(update_fields)):
+        return
+    transaction.on_commit(lambda: bump_user_versions(instance.pk))
+
+
+@receiver(post_save, sender=User)
+def user_following_changed(instance, created, update_fields, **kwargs):
+    """Админка сохраняет пользователя целиком вместе с его подписками"""
+    if not created and (update_fields is None
+                        or PROFILE_FIELDS <= set(update_fields)):
+        membership.following.invalidate((instance.pk,))
+
+
+@receiver(m2m_changed, sender=FavoriteRecipe)
+@receiver(m2m_changed, sender=ShoppingCartRecipe)
+def recipe_membership_changed(sender, instance, action, pk_set, **kwargs):
+    """Изменения избранного и списка покупок в обход API"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if isinstance(instance, User):
+        user_ids = (instance.pk,)
+    elif action == 'pre_clear':
+        user_ids = list(sender.objects.filter(
+            recipe_id=instance.pk).values_list('user_id', flat=True))
+    else:
+        user_ids = pk_set
+    target = (membership.favorites if sender is FavoriteRecipe
+              else membership.shopping_cart)
+    target.invalidate(user_ids)
@@ -11,7 +11,9 @@ class FollowingAdminInLine(admin.TabularInline):
 
 class UserAdmin(admin.ModelAdmin):
     inlines = (FollowingAdminInLine, )
-    list_display = ('username', 'email', 'last_name', 'first_name', 'is_staff')
+    list_display = ('username', 'email', 'last_name', 'first_name', 'is_staff',
+                    'recipes_count', 'followers_count')
+    readonly_fields = ('recipes_count', 'followers_count')
     list_filter = ('first_name', 'email')
     search_fields = ('email',)
 
@@ -0,0 +1,43 @@
+# Generated by Django 4.1 on 2026-10-18 20:18
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).
+        order_by().values(field).annotate(count=Count('*')).
+        values('count')), 0)
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    User.objects.update(
+        recipes_count=count_subquery(
+            apps.get_model('recipes', 'Recipe'), 'author'),
+        followers_count=count_subquery(
+            apps.get_model('users', 'Following'), 'author'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_following_unique_following'),
+        ('recipes', '0012_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество рецептов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -2,7 +2,27 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 
-class User(AbstractUser):
+class CountersMixin:
+    """Счетчики меняют запросы с F() из recipes.counters.
+
+    Сохранение существующего объекта их не записывает, иначе значения,
+    загруженные вместе с объектом, затерли бы изменения, сделанные
+    после загрузки.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            skipped = {*self.counter_fields, *self.get_deferred_fields()}
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skipped
+                and field.attname not in skipped]
+        super().save(*args, **kwargs)
+
+
+class User(CountersMixin, AbstractUser):
     email = models.EmailField('e-mail адресс', unique=True, max_length=254)
     first_name = models.CharField('Имя', max_length=150)
     last_name = models.CharField('Фамилия', max_length=150)
@@ -20,6 +40,12 @@ class User(AbstractUser):
         related_name='shopping_cart',
         blank=True
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False)
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False)
+
+    counter_fields = ('recipes_count', 'followers_count')
 
     EMAIL_FIELD = 'email'
     USERNAME_FIELD = 'email'